@@ -1,11 +1,19 @@
 import os
-from flask import Flask, redirect, url_for, send_from_directory
+import mimetypes
+from flask import Flask, redirect, url_for
 from flask_login import LoginManager
 from flask_migrate import Migrate
 from flask_wtf.csrf import CSRFProtect
 
 from config import config
 from app.models import db, User
+from app.sqlite_profile import apply_pool_options, init_sqlite_profile
+from app.view_tracking import view_tracker
+from app.image_pipeline import image_pipeline
+from app.page_cache import page_cache
+from app.search import search_index, typeahead_index
+from app.commands import register_commands
+from app.utils import send_upload
 from app.auth import auth_bp
 from app.admin import admin_bp
 from app.admin_app import admin_app_bp
@@ -14,6 +22,10 @@ from app.qr_routes import qr_bp
 from app.categories import category_bp
 from app.store import store_bp
 
+# Variantes responsive de imágenes: no todos los sistemas registran estos tipos
+mimetypes.add_type('image/webp', '.webp')
+mimetypes.add_type('image/avif', '.avif')
+
 def create_app(config_name=None):
     """Factory para crear la aplicación Flask"""
     if config_name is None:
@@ -23,13 +35,24 @@ def create_app(config_name=None):
     app.config.from_object(config[config_name])
     config[config_name].init_app(app)
     
+    # X-Sendfile: send_file solo emite la cabecera y Apache envía el archivo
+    if app.config['UPLOADS_SERVE_MODE'] == 'x-sendfile':
+        app.config['USE_X_SENDFILE'] = True
+    
     # Asegurar que SECRET_KEY esté configurada
     if not app.config.get('SECRET_KEY'):
         app.config['SECRET_KEY'] = 'dev-secret-key-change-in-production'
     
     # Inicializar extensiones
+    apply_pool_options(app)
     db.init_app(app)
+    init_sqlite_profile(app)
     migrate = Migrate(app, db)
+    view_tracker.init_app(app)
+    page_cache.init_app(app)
+    image_pipeline.init_app(app)
+    search_index.init_app(app)
+    typeahead_index.init_app(app)
     csrf = CSRFProtect(app)
     
     # Configurar Flask-Login
@@ -66,7 +89,14 @@ def create_app(config_name=None):
     # Ruta para servir archivos estáticos de uploads
     @app.route('/uploads/<path:filename>')
     def uploaded_file(filename):
-        return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+        if filename.startswith(app.config['UPLOADS_IMMUTABLE_PREFIXES']):
+            response = send_upload(filename, max_age=app.config['UPLOADS_CACHE_MAX_AGE'])
+            response.cache_control.immutable = True
+            return response
+        return send_upload(filename)
+    
+    # Comandos CLI (flask backfill-view-rollup, ...)
+    register_commands(app)
     
     # Redirección del admin sin login
     @app.route('/admin')
@@ -83,6 +113,7 @@ def create_app(config_name=None):
         
         # Crear tablas
         db.create_all()
+        search_index.create_table()
     
     return app
 
@@ -1,8 +1,18 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, current_app
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, current_app, Response, stream_with_context
 from flask_login import login_required, current_user
-from app.models import Product, ProductImage, Category, PriceHistory, ProductView, db
-from app.forms import ProductForm
+from app.models import Product, ProductImage, Category, PriceHistory, ProductViewDaily, db, normalize_sku
+from app.forms import ProductForm, RepriceForm, ProductImportForm
 from app.utils import save_product_images, generate_sku
+from app.qr_routes import invalidate_qr_cache
+from app.page_cache import invalidate_product_pages
+from app.search import search_index, typeahead_index
+from app.pagination import keyset_paginate, offset_paginate
+from app.repricing import plan_rule, plan_csv, parse_price_csv, apply_plan
+from app.product_import import ProductImporter, read_rows
+from app.catalog_export import FORMATS, generate_export
+from sqlalchemy import func
+from sqlalchemy.orm import selectinload
+import glob
 import os
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
@@ -11,89 +21,118 @@ admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 @login_required
 def dashboard():
     """Dashboard principal con lista de productos"""
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor', type=str)
     search = request.args.get('search', '', type=str)
     category_id = request.args.get('category', type=int)
     
     # Filtrar solo productos del usuario actual
     query = Product.query.filter_by(created_by=current_user.id)
     
-    # Filtro por búsqueda
+    # Filtro por búsqueda (índice de texto completo, ordenado por relevancia)
     if search:
-        query = query.filter(Product.name.contains(search) | Product.sku.contains(search))
+        query = search_index.filter(query, search)
     
     # Filtro por categoría específica
     if category_id:
         query = query.filter(Product.category_id == category_id)
     
-    products = query.order_by(Product.created_at.desc()).paginate(
-        page=page, per_page=20, error_out=False
-    )
-    
     # Obtener solo las categorías del usuario actual
     categories = Category.query.filter_by(
         user_id=current_user.id, 
         active=True
     ).order_by(Category.name).all()
     
-    # Agregar contador de productos a cada categoría
+    # Contador de productos por categoría en una sola consulta agrupada
+    counts_by_category = dict(
+        db.session.query(Product.category_id, func.count(Product.id))
+        .filter(Product.created_by == current_user.id)
+        .group_by(Product.category_id)
+        .all()
+    )
     for category in categories:
-        category.product_count = Product.query.filter_by(
-            category_id=category.id,
-            created_by=current_user.id
-        ).count()
+        category.product_count = counts_by_category.get(category.id, 0)
     
     # Total de productos del usuario
-    total_products = Product.query.filter_by(created_by=current_user.id).count()
+    total_products = sum(counts_by_category.values())
+    
+    # Con filtro de categoría o búsqueda: lista paginada por cursor
+    products = None
+    if category_id or search:
+        query = query.options(selectinload(Product.images))
+        if search:
+            # El orden por relevancia no sirve de clave: cursor con offset
+            products = offset_paginate(query.order_by(Product.created_at.desc()), cursor, per_page=20)
+        else:
+            products = keyset_paginate(
+                query, (Product.created_at, Product.id), cursor, per_page=20,
+                total=counts_by_category.get(category_id, 0)
+            )
     
     # Si no hay filtro de categoría ni búsqueda, agrupar productos por categoría
     products_by_category = None
+    visible_products = products.items if products else []
     if not category_id and not search:
+        # Una sola consulta ordenada, repartida por categoría en Python
+        all_products = Product.query.filter_by(
+            created_by=current_user.id
+        ).options(
+            selectinload(Product.images)
+        ).order_by(Product.created_at.desc()).all()
+        
+        grouped = {}
+        for product in all_products:
+            grouped.setdefault(product.category_id, []).append(product)
+        
         products_by_category = []
         
         # Productos por cada categoría
         for category in categories:
-            category_products = Product.query.filter_by(
-                created_by=current_user.id,
-                category_id=category.id
-            ).order_by(Product.created_at.desc()).all()
-            
-            if category_products:
+            if grouped.get(category.id):
                 products_by_category.append({
                     'category': category,
-                    'products': category_products
+                    'products': grouped[category.id]
                 })
         
         # Productos sin categoría
-        uncategorized_products = Product.query.filter_by(
-            created_by=current_user.id,
-            category_id=None
-        ).order_by(Product.created_at.desc()).all()
-        
-        if uncategorized_products:
+        if grouped.get(None):
             products_by_category.append({
                 'category': None,
-                'products': uncategorized_products
+                'products': grouped[None]
             })
+        
+        visible_products = all_products
+    
+    # Visitas totales de los productos mostrados en una sola consulta
+    views_by_product = {}
+    if visible_products:
+        views_query = db.session.query(ProductViewDaily.product_id, func.sum(ProductViewDaily.count))
+        if products is None:
+            # Vista agrupada: todos los productos del usuario (sin un parámetro por producto)
+            views_query = views_query.join(
+                Product, Product.id == ProductViewDaily.product_id
+            ).filter(Product.created_by == current_user.id)
+        else:
+            views_query = views_query.filter(ProductViewDaily.product_id.in_([p.id for p in products.items]))
+        views_by_product = dict(views_query.group_by(ProductViewDaily.product_id).all())
     
     # Estadísticas del dashboard
-    from sqlalchemy import func
     from datetime import datetime, timedelta
     
     # Productos más visitados (últimos 30 días) - solo del usuario actual
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+    thirty_days_ago = (datetime.utcnow() - timedelta(days=30)).date()
+    view_count = func.sum(ProductViewDaily.count)
     top_products = db.session.query(
         Product,
-        func.count(ProductView.id).label('view_count')
+        view_count.label('view_count')
     ).join(
-        ProductView, Product.id == ProductView.product_id
+        ProductViewDaily, Product.id == ProductViewDaily.product_id
     ).filter(
-        ProductView.viewed_at >= thirty_days_ago,
+        ProductViewDaily.day >= thirty_days_ago,
         Product.created_by == current_user.id
     ).group_by(
         Product.id
     ).order_by(
-        func.count(ProductView.id).desc()
+        view_count.desc()
     ).limit(10).all()
     
     return render_template('admin/dashboard.html', 
@@ -103,7 +142,8 @@ def dashboard():
                          categories=categories,
                          selected_category=category_id,
                          top_products=top_products,
-                         total_products=total_products)
+                         total_products=total_products,
+                         views_by_product=views_by_product)
 
 @admin_bp.route('/product/new', methods=['GET', 'POST'])
 @login_required
@@ -182,6 +222,7 @@ def product_edit(product_id):
         # Verificar si el precio cambió
         old_price = product.price
         new_price = form.price.data
+        old_sku = product.sku
         
         product.name = form.name.data
         product.sku = form.sku.data
@@ -208,6 +249,12 @@ def product_edit(product_id):
                 flash(f'Error al subir nuevas imágenes: {str(e)}', 'warning')
         
         db.session.commit()
+        
+        # El QR codifica la URL pública, que depende del SKU
+        if product.sku != old_sku:
+            invalidate_qr_cache(product.id)
+        invalidate_product_pages(old_sku, product.sku)
+        
         flash('Producto actualizado exitosamente', 'success')
         return redirect(url_for('admin.product_detail', product_id=product.id))
     
@@ -227,6 +274,8 @@ def product_delete(product_id):
     if os.path.exists(product_folder):
         import shutil
         shutil.rmtree(product_folder)
+    invalidate_qr_cache(product_id)
+    invalidate_product_pages(product.sku)
     
     db.session.delete(product)
     db.session.commit()
@@ -234,6 +283,98 @@ def product_delete(product_id):
     flash('Producto eliminado exitosamente', 'success')
     return redirect(url_for('admin.dashboard'))
 
+@admin_bp.route('/products/reprice', methods=['GET', 'POST'])
+@login_required
+def reprice():
+    """Cambio masivo de precios: vista previa y luego aplicar en una transacción"""
+    product_ids = request.form.getlist('ids', type=int)
+    form = RepriceForm(user_id=current_user.id, product_ids=product_ids)
+    action = request.form.get('action')
+    
+    if not action:
+        # Llegada desde el dashboard (selección) o con ?category=
+        if product_ids:
+            form.scope.data = 'selection'
+        elif request.args.get('category', type=int) is not None:
+            form.category_id.data = request.args.get('category', type=int)
+        return render_template('admin/reprice.html', form=form, plan=None, product_ids=product_ids)
+    
+    plan = None
+    if form.validate_on_submit():
+        try:
+            if form.scope.data == 'csv':
+                # El CSV se sube en la vista previa y viaja oculto hasta aplicar
+                if form.csv_file.data:
+                    form.csv_data.data = form.csv_file.data.read().decode('utf-8-sig', errors='replace')
+                if not form.csv_data.data:
+                    raise ValueError('Sube un archivo CSV con las columnas sku y price')
+                prices, errors = parse_price_csv(form.csv_data.data)
+                plan = plan_csv(current_user.id, prices, errors)
+            else:
+                plan = plan_rule(
+                    current_user.id, form.operation.data, form.value.data, form.round_99.data,
+                    category_id=form.category_id.data if form.scope.data == 'category' else None,
+                    product_ids=product_ids if form.scope.data == 'selection' else None
+                )
+        except ValueError as e:
+            flash(str(e), 'danger')
+    
+    if plan is not None and action == 'apply':
+        count = apply_plan(plan, current_user.id)
+        flash(f'{count} precios actualizados', 'success')
+        if form.scope.data == 'category':
+            return redirect(url_for('admin.dashboard', category=form.category_id.data or None))
+        return redirect(url_for('admin.dashboard'))
+    
+    return render_template('admin/reprice.html',
+                         form=form,
+                         plan=plan,
+                         product_ids=product_ids,
+                         preview_rows=current_app.config['REPRICE_PREVIEW_ROWS'])
+
+@admin_bp.route('/products/import', methods=['GET', 'POST'])
+@login_required
+def product_import():
+    """Importación masiva de productos desde CSV o XLSX"""
+    form = ProductImportForm()
+    result = None
+    
+    if form.validate_on_submit():
+        importer = ProductImporter(current_user.id,
+                                   batch_size=current_app.config['IMPORT_BATCH_SIZE'],
+                                   dry_run=form.dry_run.data)
+        try:
+            result = importer.run(read_rows(form.file.data.stream, form.file.data.filename))
+        except ValueError as e:
+            flash(str(e), 'danger')
+        else:
+            if form.dry_run.data:
+                flash(f'Validación terminada: se crearían {result.created} productos', 'info')
+            elif result.created:
+                flash(f'{result.created} productos importados', 'success')
+            else:
+                flash('No se importó ningún producto', 'warning')
+    
+    return render_template('admin/product_import.html', form=form, result=result)
+
+@admin_bp.route('/export')
+@login_required
+def catalog_export():
+    """Descarga el catálogo del usuario en CSV o JSON Lines, en streaming"""
+    from datetime import datetime
+    
+    fmt = request.args.get('format', 'csv')
+    if fmt not in FORMATS:
+        return jsonify({'error': f'Formatos disponibles: {", ".join(FORMATS)}'}), 400
+    mimetype, extension = FORMATS[fmt]
+    
+    body = generate_export(current_user.id, fmt, current_app.config['EXPORT_BATCH_SIZE'])
+    filename = f"productos-{datetime.utcnow():%Y-%m-%d}.{extension}"
+    return Response(stream_with_context(body), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'X-Accel-Buffering': 'no',  # nginx: enviar cada bloque sin esperar al final
+    })
+
 @admin_bp.route('/product/<int:product_id>/toggle-active', methods=['POST'])
 @login_required
 def product_toggle_active(product_id):
@@ -246,6 +387,7 @@ def product_toggle_active(product_id):
     # Cambiar el estado
     product.active = not product.active
     db.session.commit()
+    invalidate_product_pages(product.sku)
     
     # Mensaje flash según el nuevo estado
     if product.active:
@@ -267,14 +409,15 @@ def delete_product_image(image_id):
     if os.path.exists(image_path):
         os.remove(image_path)
     
-    # Eliminar thumbnail si existe
+    # Eliminar derivados (thumbnail, miniatura, escalera srcset) si existen
     name, ext = os.path.splitext(image.filename)
-    thumb_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'products', str(product_id), f"{name}_thumb{ext}")
-    if os.path.exists(thumb_path):
-        os.remove(thumb_path)
+    for derivative_path in glob.glob(os.path.join(current_app.config['UPLOAD_FOLDER'], 'products', str(product_id), f"{name}_*")):
+        os.remove(derivative_path)
     
+    sku = image.product.sku
     db.session.delete(image)
     db.session.commit()
+    invalidate_product_pages(sku)
     
     return jsonify({'success': True})
 
@@ -347,6 +490,7 @@ def save_camera_capture():
         )
         db.session.add(product_image)
         db.session.commit()
+        invalidate_product_pages(product.sku)
         
         return jsonify({
             'success': True,
@@ -358,59 +502,73 @@ def save_camera_capture():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@admin_bp.route('/api/search')
+@login_required
+def api_search():
+    """Búsqueda incremental (typeahead) de productos del usuario"""
+    query = request.args.get('q', '', type=str)
+    limit = max(1, min(request.args.get('limit', current_app.config['TYPEAHEAD_LIMIT'], type=int), 50))
+    
+    results = []
+    for entry in typeahead_index.search(current_user.id, query, limit):
+        thumbnail_url = None
+        if entry['image']:
+            # Miniatura de lista (la original mientras se procesa)
+            filename, status, version = entry['image']
+            image = ProductImage(product_id=entry['id'], filename=filename, status=status, version=version)
+            thumbnail_url = image.icon_url
+        results.append({
+            'id': entry['id'],
+            'name': entry['name'],
+            'sku': entry['sku'],
+            'price': float(entry['price']),
+            'price_formatted': f"${entry['price']:.2f}",
+            'thumbnail_url': thumbnail_url,
+            'url': url_for('admin.product_detail', product_id=entry['id']),
+        })
+    
+    return jsonify({'query': query, 'results': results})
+
 @admin_bp.route('/barcode-scanner')
 @login_required
 def barcode_scanner():
     """Interfaz para escanear códigos de barras/QR"""
     return render_template('admin/barcode_scanner.html')
 
+def _scanned_product_payload(product):
+    """Datos de un producto encontrado por el escáner"""
+    return {
+        'id': product.id,
+        'name': product.name,
+        'sku': product.sku,
+        'price': float(product.price) if product.price is not None else None,
+        # 'stock' may not be present on Product in this schema; use getattr as safe fallback
+        'stock': getattr(product, 'stock', None),
+        'url': url_for('admin.product_detail', product_id=product.id)
+    }
+
 @admin_bp.route('/api/check-product/<sku>')
 @login_required
 def check_product_by_sku(sku):
     """API para verificar si un producto existe por SKU"""
-    # Normalizar SKU recibido
-    import re
-    from sqlalchemy import func
-
+    # Una sola búsqueda por el índice (created_by, sku_normalized); si dos SKUs
+    # solo difieren en mayúsculas o símbolos, gana el que coincide sin sanear
     sku_clean = (sku or '').strip()
-
-    # Log incoming request for debugging
-    current_app.logger.warning(f"[check_product_by_sku] user_id={current_user.id} incoming_sku={repr(sku)} cleaned_sku={repr(sku_clean)}")
-
-    # Primero: búsqueda exacta case-insensitive dentro del usuario
-    product = Product.query.filter(
-        func.lower(Product.sku) == sku_clean.lower(),
-        Product.created_by == current_user.id
+    product = Product.query.filter_by(
+        created_by=current_user.id,
+        sku_normalized=normalize_sku(sku_clean)
+    ).order_by(
+        (func.lower(Product.sku) == sku_clean.lower()).desc()
     ).first()
-
-    # Si no encontramos, intentar una versión saneada (quitar caracteres no alfanuméricos)
-    if not product:
-        alt = re.sub(r'[^A-Za-z0-9\-_.]', '', sku_clean)
-        current_app.logger.warning(f"[check_product_by_sku] trying alternate sanitized sku={repr(alt)}")
-        if alt and alt.lower() != sku_clean.lower():
-            product = Product.query.filter(
-                func.lower(Product.sku) == alt.lower(),
-                Product.created_by == current_user.id
-            ).first()
-
-    # Log the outcome
-    if product:
-        current_app.logger.warning(f"[check_product_by_sku] FOUND product id={product.id} sku={product.sku} user_id={product.created_by}")
-    else:
-        current_app.logger.warning(f"[check_product_by_sku] NOT FOUND for user_id={current_user.id} sku={repr(sku_clean)}")
+    
+    current_app.logger.debug(
+        f"[check_product_by_sku] user_id={current_user.id} sku={sku_clean!r} found={product.id if product else None}"
+    )
     
     if product:
         return jsonify({
             'exists': True,
-            'product': {
-                'id': product.id,
-                'name': product.name,
-                'sku': product.sku,
-                'price': float(product.price) if product.price is not None else None,
-                # 'stock' may not be present on Product in this schema; use getattr as safe fallback
-                'stock': getattr(product, 'stock', None),
-                'url': url_for('admin.product_detail', product_id=product.id)
-            }
+            'product': _scanned_product_payload(product)
         })
     else:
         return jsonify({
@@ -418,34 +576,108 @@ def check_product_by_sku(sku):
             'create_url': url_for('admin.product_new')
         })
 
+@admin_bp.route('/api/check-products', methods=['POST'])
+@login_required
+def check_products_by_sku():
+    """API para verificar varios SKUs en una sola consulta (escaneo continuo)
+    
+    Recibe {"skus": [...]} y devuelve un resultado por SKU recibido, con la
+    misma forma que /api/check-product/<sku>.
+    """
+    data = request.get_json(silent=True) or {}
+    skus = data.get('skus')
+    if not isinstance(skus, list) or not all(isinstance(sku, str) for sku in skus):
+        return jsonify({'error': 'Se esperaba {"skus": [...]}'}), 400
+    
+    max_batch = current_app.config['SKU_LOOKUP_BATCH_MAX']
+    if len(skus) > max_batch:
+        return jsonify({'error': f'Máximo {max_batch} SKUs por petición'}), 400
+    
+    normalized = {sku: normalize_sku(sku) for sku in skus}
+    products = {}
+    if normalized:
+        for product in Product.query.filter(
+            Product.created_by == current_user.id,
+            Product.sku_normalized.in_(set(normalized.values()))
+        ):
+            products.setdefault(product.sku_normalized, []).append(product)
+    
+    results = {}
+    for sku, key in normalized.items():
+        matches = products.get(key)
+        if matches:
+            # Preferir la coincidencia exacta si varios SKUs se normalizan igual
+            sku_lower = sku.strip().lower()
+            product = next((p for p in matches if p.sku.lower() == sku_lower), matches[0])
+            results[sku] = {'exists': True, 'product': _scanned_product_payload(product)}
+        else:
+            results[sku] = {'exists': False}
+    
+    return jsonify({
+        'results': results,
+        'create_url': url_for('admin.product_new')
+    })
+
 @admin_bp.route('/product/<int:product_id>/price-chart-data')
 @login_required
 def price_chart_data(product_id):
-    """Obtener datos del historial de precios para la gráfica"""
+    """Obtener datos del historial de precios para la gráfica
+
+    Parámetros opcionales: from y to (YYYY-MM-DD, incluidos) y max_points.
+    La serie se reduce en el servidor a max_points puntos como máximo.
+    """
+    from datetime import datetime, timedelta
+    from app.chart_data import compress_steps, lttb
+    
     product = Product.query.filter_by(
         id=product_id,
         created_by=current_user.id
     ).first_or_404()
     
-    # Obtener historial de precios
-    price_history = PriceHistory.query.filter_by(
-        product_id=product_id
-    ).order_by(
-        PriceHistory.changed_at
-    ).all()
-    
-    # Formatear datos para la gráfica
-    data = []
-    for record in price_history:
-        data.append({
-            'date': record.changed_at.strftime('%Y-%m-%d %H:%M'),
-            'timestamp': int(record.changed_at.timestamp() * 1000),
-            'price': float(record.price)
-        })
+    try:
+        date_from = datetime.strptime(request.args['from'], '%Y-%m-%d') if request.args.get('from') else None
+        date_to = datetime.strptime(request.args['to'], '%Y-%m-%d') if request.args.get('to') else None
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Fechas en formato YYYY-MM-DD'}), 400
+    max_points = request.args.get('max_points', current_app.config['PRICE_CHART_MAX_POINTS'], type=int)
+    max_points = min(max(max_points, 2), current_app.config['PRICE_CHART_MAX_POINTS_LIMIT'])
+    
+    # Solo fecha y precio, sin cargar objetos ORM (índice product_id, changed_at)
+    query = db.session.query(PriceHistory.changed_at, PriceHistory.price).filter(
+        PriceHistory.product_id == product_id
+    )
+    if date_from:
+        query = query.filter(PriceHistory.changed_at >= date_from)
+    if date_to:
+        query = query.filter(PriceHistory.changed_at < date_to + timedelta(days=1))
+    rows = query.order_by(PriceHistory.changed_at).all()
+    total = len(rows)
+    
+    # Precio vigente al inicio del rango: el último cambio anterior a `from`
+    # (salvo que haya un cambio justo en `from`: serían dos puntos con la misma x)
+    if date_from and not (rows and rows[0][0] == date_from):
+        previous = db.session.query(PriceHistory.price).filter(
+            PriceHistory.product_id == product_id,
+            PriceHistory.changed_at < date_from
+        ).order_by(PriceHistory.changed_at.desc()).first()
+        if previous:
+            rows.insert(0, (date_from, previous.price))
+    
+    points = [(changed_at.timestamp() * 1000, float(price), changed_at) for changed_at, price in rows]
+    points = lttb(compress_steps(points), max_points)
+    
+    # Formatear solo los puntos que se envían
+    data = [{
+        'date': changed_at.strftime('%Y-%m-%d %H:%M'),
+        'timestamp': int(timestamp),
+        'price': price
+    } for timestamp, price, changed_at in points]
     
     return jsonify({
         'success': True,
         'product_name': product.name,
+        'total_points': total,
+        'downsampled': len(data) < len(rows),
         'data': data
     })
 
@@ -462,19 +694,17 @@ def product_views_data(product_id):
     ).first_or_404()
     days = request.args.get('days', 30, type=int)
     
-    start_date = datetime.utcnow() - timedelta(days=days)
+    start_day = (datetime.utcnow() - timedelta(days=days)).date()
     
-    # Agrupar visitas por día
+    # Visitas por día (rollup diario, ya agregado)
     views_by_day = db.session.query(
-        func.date(ProductView.viewed_at).label('date'),
-        func.count(ProductView.id).label('count')
+        ProductViewDaily.day.label('date'),
+        ProductViewDaily.count.label('count')
     ).filter(
-        ProductView.product_id == product_id,
-        ProductView.viewed_at >= start_date
-    ).group_by(
-        func.date(ProductView.viewed_at)
+        ProductViewDaily.product_id == product_id,
+        ProductViewDaily.day >= start_day
     ).order_by(
-        func.date(ProductView.viewed_at)
+        ProductViewDaily.day
     ).all()
     
     # Formatear datos
@@ -5,8 +5,12 @@ Accesible desde /admin_app - Solo para superadministradores
 from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required, current_user
 from functools import wraps
-from app.models import db, User, Product, Category, Store, ProductView
-from sqlalchemy import func, desc
+from app.models import db, User, Product, Category, Store, ProductViewDaily
+from app.view_tracking import view_tracker
+from app.page_cache import page_cache
+from app.pagination import keyset_paginate, cached_count
+from sqlalchemy import func, desc, case, distinct
+from sqlalchemy.orm import joinedload
 from datetime import datetime, timedelta
 
 admin_app_bp = Blueprint('admin_app', __name__, url_prefix='/admin_app')
@@ -40,30 +44,37 @@ def check_superadmin_access():
 def dashboard():
     """Dashboard principal del panel de super administración"""
     
-    # Estadísticas generales
-    total_users = User.query.count()
-    total_products = Product.query.count()
-    total_categories = Category.query.count()
-    total_stores = Store.query.count()
-    
-    # Usuarios activos (con productos)
-    active_users = db.session.query(User).join(Product).distinct().count()
-    
-    # Productos creados últimos 30 días
     thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    recent_products = Product.query.filter(Product.created_at >= thirty_days_ago).count()
     
-    # Usuarios registrados últimos 30 días
-    recent_users = User.query.filter(User.created_at >= thirty_days_ago).count()
+    # Usuarios: total y registrados últimos 30 días
+    total_users, recent_users = db.session.query(
+        func.count(User.id),
+        func.coalesce(func.sum(case((User.created_at >= thirty_days_ago, 1), else_=0)), 0)
+    ).one()
+    
+    # Productos: total, creados últimos 30 días y usuarios activos (con productos)
+    total_products, recent_products, active_users = db.session.query(
+        func.count(Product.id),
+        func.coalesce(func.sum(case((Product.created_at >= thirty_days_ago, 1), else_=0)), 0),
+        func.count(distinct(Product.created_by))
+    ).one()
+    
+    # Categorías y tiendas
+    total_categories, total_stores = db.session.query(
+        db.select(func.count(Category.id)).scalar_subquery(),
+        db.select(func.count(Store.id)).scalar_subquery()
+    ).one()
     
     # Productos más visitados (últimos 30 días)
     top_products = db.session.query(
         Product,
-        func.count(ProductView.id).label('view_count')
+        func.sum(ProductViewDaily.count).label('view_count')
+    ).options(
+        joinedload(Product.creator)
     ).join(
-        ProductView, Product.id == ProductView.product_id
+        ProductViewDaily, Product.id == ProductViewDaily.product_id
     ).filter(
-        ProductView.viewed_at >= thirty_days_ago
+        ProductViewDaily.day >= thirty_days_ago.date()
     ).group_by(
         Product.id
     ).order_by(
@@ -86,7 +97,9 @@ def dashboard():
     latest_users = User.query.order_by(User.created_at.desc()).limit(10).all()
     
     # Últimos productos creados
-    latest_products = Product.query.order_by(Product.created_at.desc()).limit(10).all()
+    latest_products = Product.query.options(
+        joinedload(Product.creator)
+    ).order_by(Product.created_at.desc()).limit(10).all()
     
     return render_template('admin_app/dashboard.html',
                          total_users=total_users,
@@ -105,7 +118,7 @@ def dashboard():
 @superadmin_required
 def user_list():
     """Lista de todos los usuarios del sistema"""
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor', type=str)
     search = request.args.get('search', '', type=str)
     filter_type = request.args.get('filter', 'all', type=str)
     
@@ -128,16 +141,25 @@ def user_list():
         # Usuarios sin productos
         query = query.outerjoin(Product).group_by(User.id).having(func.count(Product.id) == 0)
     
-    # Paginación
-    users = query.order_by(User.created_at.desc()).paginate(
-        page=page, per_page=20, error_out=False
+    # Paginación por cursor (total aproximado, cacheado por filtro)
+    users = keyset_paginate(
+        query, (User.created_at, User.id), cursor, per_page=20,
+        total=cached_count(query, ('admin_app.user_list', search, filter_type))
     )
     
-    # Agregar contadores a cada usuario
+    # Agregar contadores a cada usuario (una consulta agrupada por contador)
+    user_ids = [user.id for user in users.items]
+    product_counts = _counts_by(Product.created_by, user_ids)
+    category_counts = _counts_by(Category.user_id, user_ids)
+    store_owners = {
+        user_id for (user_id,) in
+        db.session.query(Store.user_id).filter(Store.user_id.in_(user_ids)).all()
+    } if user_ids else set()
+    
     for user in users.items:
-        user.product_count = Product.query.filter_by(created_by=user.id).count()
-        user.category_count = Category.query.filter_by(user_id=user.id).count()
-        user.has_store = Store.query.filter_by(user_id=user.id).first() is not None
+        user.product_count = product_counts.get(user.id, 0)
+        user.category_count = category_counts.get(user.id, 0)
+        user.has_store = user.id in store_owners
     
     return render_template('admin_app/user_list.html',
                          users=users,
@@ -264,7 +286,7 @@ def user_toggle_admin(user_id):
 @superadmin_required
 def product_list():
     """Lista de todos los productos del sistema"""
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor', type=str)
     search = request.args.get('search', '', type=str)
     user_id = request.args.get('user_id', type=int)
     
@@ -281,15 +303,13 @@ def product_list():
             (Product.name.contains(search)) | (Product.sku.contains(search))
         )
     
-    # Paginación
-    products = query.order_by(Product.created_at.desc()).paginate(
-        page=page, per_page=20, error_out=False
+    # Paginación por cursor (propietario y categoría cargados en la misma consulta)
+    products = keyset_paginate(
+        query.options(joinedload(Product.creator), joinedload(Product.category)),
+        (Product.created_at, Product.id), cursor, per_page=20,
+        total=cached_count(query, ('admin_app.product_list', user_id, search))
     )
     
-    # Cargar información de usuarios para cada producto
-    for product in products.items:
-        product.owner = User.query.get(product.created_by)
-    
     # Lista de usuarios para el filtro
     users = User.query.order_by(User.email).all()
     
@@ -305,13 +325,16 @@ def store_list():
     """Lista de todas las tiendas configuradas"""
     page = request.args.get('page', 1, type=int)
     
-    stores = Store.query.order_by(Store.updated_at.desc()).paginate(
+    stores = Store.query.options(
+        joinedload(Store.owner)
+    ).order_by(Store.updated_at.desc()).paginate(
         page=page, per_page=20, error_out=False
     )
     
     # Agregar contadores a cada tienda
+    product_counts = _counts_by(Product.created_by, [store.user_id for store in stores.items])
     for store in stores.items:
-        store.product_count = Product.query.filter_by(created_by=store.user_id).count()
+        store.product_count = product_counts.get(store.user_id, 0)
     
     return render_template('admin_app/store_list.html', stores=stores)
 
@@ -325,19 +348,30 @@ def stats():
     week_ago = today - timedelta(days=7)
     month_ago = today - timedelta(days=30)
     
-    # Usuarios por periodo
-    users_today = User.query.filter(func.date(User.created_at) == today).count()
-    users_week = User.query.filter(func.date(User.created_at) >= week_ago).count()
-    users_month = User.query.filter(func.date(User.created_at) >= month_ago).count()
-    
-    # Productos por periodo
-    products_today = Product.query.filter(func.date(Product.created_at) == today).count()
-    products_week = Product.query.filter(func.date(Product.created_at) >= week_ago).count()
-    products_month = Product.query.filter(func.date(Product.created_at) >= month_ago).count()
+    # Usuarios por periodo (un solo recorrido con agregados condicionales)
+    user_day = func.date(User.created_at)
+    total_users, users_today, users_week, users_month = db.session.query(
+        func.count(User.id),
+        func.coalesce(func.sum(case((user_day == today, 1), else_=0)), 0),
+        func.coalesce(func.sum(case((user_day >= week_ago, 1), else_=0)), 0),
+        func.coalesce(func.sum(case((user_day >= month_ago, 1), else_=0)), 0)
+    ).one()
+    
+    # Productos por periodo y usuarios con productos
+    product_day = func.date(Product.created_at)
+    products_today, products_week, products_month, users_with_products = db.session.query(
+        func.coalesce(func.sum(case((product_day == today, 1), else_=0)), 0),
+        func.coalesce(func.sum(case((product_day >= week_ago, 1), else_=0)), 0),
+        func.coalesce(func.sum(case((product_day >= month_ago, 1), else_=0)), 0),
+        func.count(distinct(Product.created_by))
+    ).one()
     
     # Distribución de usuarios por actividad
-    users_with_products = db.session.query(User.id).join(Product).distinct().count()
-    users_without_products = User.query.count() - users_with_products
+    users_without_products = total_users - users_with_products
+    
+    # Contadores del registro de visitas y de la caché de páginas (proceso actual)
+    view_tracker_stats = view_tracker.stats()
+    page_cache_stats = page_cache.stats()
     
     return render_template('admin_app/stats.html',
                          users_today=users_today,
@@ -347,4 +381,17 @@ def stats():
                          products_week=products_week,
                          products_month=products_month,
                          users_with_products=users_with_products,
-                         users_without_products=users_without_products)
+                         users_without_products=users_without_products,
+                         view_tracker_stats=view_tracker_stats,
+                         page_cache_stats=page_cache_stats)
+
+def _counts_by(column, ids):
+    """Cuenta filas agrupadas por `column` para los ids dados: {id: total}"""
+    if not ids:
+        return {}
+    return dict(
+        db.session.query(column, func.count())
+        .filter(column.in_(ids))
+        .group_by(column)
+        .all()
+    )
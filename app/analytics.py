@@ -0,0 +1,220 @@
+"""
+Exportación columnar de visitas e historial de precios, y reportes sobre ella.
+
+`flask analytics export` copia product_view y price_history a
+ANALYTICS_FOLDER/<tabla>/<AAAA-MM>/<columna>.npy: un archivo NumPy por columna
+y mes. La tabla se lee en una sola pasada por bloques de ANALYTICS_EXPORT_CHUNK
+filas (sin ORDER BY) y cada bloque se añade a los archivos de su mes, así que
+la memoria no depende del tamaño de la tabla. Cada mes se escribe en una
+carpeta temporal y se sustituye al final, de modo que un reporte nunca ve un
+mes a medias.
+
+AnalyticsReports responde las preguntas del panel (visitas por día, productos
+más vistos, mapa de calor por hora, totales por tienda) abriendo esas columnas
+con mmap y agregando con NumPy, sin consultar la base de datos: el análisis
+pesado deja de competir con las escrituras de los escaneos.
+
+Las fechas son UTC, como en la base de datos.
+"""
+import json
+import os
+import shutil
+from datetime import datetime
+import numpy as np
+from app.models import db, Product, ProductView, PriceHistory
+
+# Columnas exportadas de cada tabla: consulta, columna de fecha (define el mes) y tipos
+TABLES = {
+    'product_view': {
+        'query': db.select(ProductView.product_id, Product.created_by, ProductView.viewed_at)
+                 .join(Product, Product.id == ProductView.product_id),
+        'time': ProductView.viewed_at,
+        'columns': [('product_id', 'int32'), ('user_id', 'int32'), ('viewed_at', 'datetime64[s]')],
+    },
+    'price_history': {
+        'query': db.select(PriceHistory.product_id, Product.created_by, PriceHistory.changed_at,
+                           PriceHistory.price)
+                 .join(Product, Product.id == PriceHistory.product_id),
+        'time': PriceHistory.changed_at,
+        'columns': [('product_id', 'int32'), ('user_id', 'int32'), ('changed_at', 'datetime64[s]'),
+                    ('price', 'float64')],
+    },
+}
+
+WEEKDAYS = ['Lun', 'Mar', 'Mié', 'Jue', 'Vie', 'Sáb', 'Dom']
+
+def exported_months(folder, table):
+    """Meses ya exportados de una tabla ('AAAA-MM'), en orden"""
+    path = os.path.join(folder, table)
+    if not os.path.isdir(path):
+        return []
+    return sorted(name for name in os.listdir(path) if not name.startswith('.'))
+
+class _MonthWriter:
+    """Columnas de un mes en archivos binarios temporales, escritas por bloques"""
+
+    def __init__(self, folder, columns):
+        os.makedirs(folder)
+        self.folder = folder
+        self.columns = columns
+        self.rows = 0
+        self._files = {name: open(os.path.join(folder, f'{name}.raw'), 'wb') for name, _ in columns}
+
+    def append(self, arrays):
+        for name, _ in self.columns:
+            arrays[name].tofile(self._files[name])
+        self.rows += len(arrays[self.columns[0][0]])
+
+    def close(self):
+        """Convierte cada columna en un .npy (cabecera + datos) y guarda el manifiesto"""
+        for name, dtype in self.columns:
+            self._files[name].close()
+            raw_path = os.path.join(self.folder, f'{name}.raw')
+            with open(os.path.join(self.folder, f'{name}.npy'), 'wb') as out, open(raw_path, 'rb') as raw:
+                np.lib.format.write_array_header_1_0(out, {
+                    'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)),
+                    'fortran_order': False,
+                    'shape': (self.rows,),
+                })
+                shutil.copyfileobj(raw, out)
+            os.remove(raw_path)
+
+        with open(os.path.join(self.folder, 'manifest.json'), 'w') as f:
+            json.dump({'rows': self.rows, 'exported_at': datetime.utcnow().isoformat(timespec='seconds')}, f)
+
+def export_table(conn, folder, table, since=None, chunk_size=10000):
+    """Exporta una tabla desde el mes de `since` (o completa) y devuelve {mes: filas}
+
+    Los meses a partir de `since` se reescriben enteros; los anteriores no se
+    tocan. Un mes exportado que ya no tiene filas se elimina.
+    """
+    spec = TABLES[table]
+    time_column = spec['columns'][2][0]
+    query = spec['query']
+    start_month = None
+    if since is not None:
+        start_month = np.datetime64(since, 'M')
+        query = query.where(spec['time'] >= datetime(since.year, since.month, 1))
+
+    base = os.path.join(folder, table)
+    os.makedirs(base, exist_ok=True)
+    writers = {}
+    try:
+        result = conn.execution_options(yield_per=chunk_size).execute(query)
+        for rows in result.partitions():
+            values = list(zip(*rows))
+            arrays = {name: np.array(values[i], dtype=dtype) for i, (name, dtype) in enumerate(spec['columns'])}
+            months = arrays[time_column].astype('datetime64[M]')
+            for month in np.unique(months):
+                label = str(month)
+                if label not in writers:
+                    temp = os.path.join(base, f'.{label}.tmp')
+                    shutil.rmtree(temp, ignore_errors=True)
+                    writers[label] = _MonthWriter(temp, spec['columns'])
+                mask = months == month
+                writers[label].append({name: array[mask] for name, array in arrays.items()})
+        for writer in writers.values():
+            writer.close()
+    except BaseException:
+        for writer in writers.values():
+            shutil.rmtree(writer.folder, ignore_errors=True)
+        raise
+
+    # Sustituir los meses reexportados y quitar los que quedaron vacíos
+    for label in exported_months(folder, table):
+        if label not in writers and (start_month is None or np.datetime64(label, 'M') >= start_month):
+            shutil.rmtree(os.path.join(base, label))
+    for label, writer in writers.items():
+        final = os.path.join(base, label)
+        old = os.path.join(base, f'.{label}.old')
+        if os.path.isdir(final):
+            os.replace(final, old)
+        os.replace(writer.folder, final)
+        shutil.rmtree(old, ignore_errors=True)
+
+    return {label: writer.rows for label, writer in sorted(writers.items())}
+
+def _add_counts(total, values, minlength=0):
+    """Suma np.bincount(values) a total, ampliándolo si hace falta"""
+    counts = np.bincount(values, minlength=minlength)
+    if len(counts) > len(total):
+        total = np.pad(total, (0, len(counts) - len(total)))
+    total[:len(counts)] += counts
+    return total
+
+class AnalyticsReports:
+    """Reportes sobre las columnas exportadas (memoria mapeada, sin base de datos)"""
+
+    def __init__(self, folder):
+        self.folder = folder
+
+    def _months(self, table, start=None, end=None):
+        """Columnas de cada mes exportado que se solapa con [start, end)"""
+        for label in exported_months(self.folder, table):
+            month = np.datetime64(label, 'M')
+            if start is not None and month < np.datetime64(start, 'M'):
+                continue
+            if end is not None and month > np.datetime64(end, 'M'):
+                continue
+            path = os.path.join(self.folder, table, label)
+            columns = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+                       for name, _ in TABLES[table]['columns']}
+            yield columns
+
+    def _filtered(self, table, start=None, end=None, **equals):
+        """(columnas, máscara) de cada mes con los filtros de fecha e igualdad aplicados"""
+        time_column = TABLES[table]['columns'][2][0]
+        for columns in self._months(table, start, end):
+            times = columns[time_column]
+            mask = np.ones(len(times), dtype=bool)
+            if start is not None:
+                mask &= times >= np.datetime64(start, 's')
+            if end is not None:
+                mask &= times < np.datetime64(end, 's')
+            for name, value in equals.items():
+                if value is not None:
+                    mask &= columns[name] == value
+            yield columns, mask
+
+    def views_per_day(self, start=None, end=None, user_id=None, product_id=None):
+        """[(fecha, visitas)] en orden, solo los días con visitas"""
+        result = []
+        for columns, mask in self._filtered('product_view', start, end, user_id=user_id, product_id=product_id):
+            days, counts = np.unique(columns['viewed_at'][mask].astype('datetime64[D]'), return_counts=True)
+            # Los meses no se solapan: basta con concatenar
+            result.extend(zip(days.astype(object), counts.tolist()))
+        return result
+
+    def top_products(self, start=None, end=None, user_id=None, limit=10):
+        """[(product_id, visitas)] de los productos más vistos"""
+        total = np.zeros(0, dtype=np.int64)
+        for columns, mask in self._filtered('product_view', start, end, user_id=user_id):
+            total = _add_counts(total, columns['product_id'][mask])
+        top = np.argsort(-total, kind='stable')[:limit]
+        return [(int(product_id), int(total[product_id])) for product_id in top if total[product_id]]
+
+    def hour_heatmap(self, start=None, end=None, user_id=None, product_id=None):
+        """Matriz 7x24 de visitas por día de la semana (lunes = 0) y hora"""
+        total = np.zeros(7 * 24, dtype=np.int64)
+        for columns, mask in self._filtered('product_view', start, end, user_id=user_id, product_id=product_id):
+            seconds = columns['viewed_at'][mask].astype(np.int64)
+            hours = seconds // 3600
+            weekdays = (hours // 24 + 3) % 7  # el 1970-01-01 fue jueves
+            total = _add_counts(total, weekdays * 24 + hours % 24, minlength=7 * 24)
+        return total.reshape(7, 24)
+
+    def tenant_totals(self, start=None, end=None):
+        """{user_id: {'views': n, 'price_changes': n}} de todas las tiendas con actividad"""
+        views = np.zeros(0, dtype=np.int64)
+        for columns, mask in self._filtered('product_view', start, end):
+            views = _add_counts(views, columns['user_id'][mask])
+        changes = np.zeros(0, dtype=np.int64)
+        for columns, mask in self._filtered('price_history', start, end):
+            changes = _add_counts(changes, columns['user_id'][mask])
+
+        size = max(len(views), len(changes))
+        views, changes = np.pad(views, (0, size - len(views))), np.pad(changes, (0, size - len(changes)))
+        return {
+            int(user_id): {'views': int(views[user_id]), 'price_changes': int(changes[user_id])}
+            for user_id in np.flatnonzero(views + changes)
+        }
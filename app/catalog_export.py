@@ -0,0 +1,97 @@
+"""
+Exportación del catálogo de un usuario en CSV o JSON Lines.
+
+Una sola consulta con cursor del lado del servidor (yield_per) trae cada
+producto con el nombre de su categoría, su imagen principal (nombre y versión,
+para construir la misma URL que las plantillas) y el total de visitas del
+rollup diario (subconsultas correlacionadas que resuelven los índices de
+product_image y product_view_daily). Las filas se convierten a
+texto por bloques y se entregan desde un generador, así que la memoria no
+crece con el catálogo y los primeros bytes salen de inmediato.
+
+Las columnas sku, name, price, description, category y active son las que
+acepta la importación (ver app/product_import.py), así que un CSV exportado
+puede volver a importarse.
+"""
+import csv
+import io
+import json
+from flask import url_for
+from app.models import db, Product, Category, ProductImage, ProductViewDaily
+
+FIELDS = ['sku', 'name', 'price', 'description', 'category', 'active',
+          'image_url', 'public_url', 'total_views', 'created_at', 'updated_at']
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+}
+
+def export_query(user_id):
+    """Productos del usuario con categoría, imagen principal y visitas, en una consulta"""
+    def main_image(column):
+        return (
+            db.select(column)
+            .where(ProductImage.product_id == Product.id)
+            .order_by(ProductImage.order, ProductImage.id)
+            .limit(1)
+            .correlate(Product)
+            .scalar_subquery()
+        )
+    total_views = (
+        db.select(db.func.coalesce(db.func.sum(ProductViewDaily.count), 0))
+        .where(ProductViewDaily.product_id == Product.id)
+        .correlate(Product)
+        .scalar_subquery()
+    )
+    return (
+        db.select(Product.id, Product.sku, Product.name, Product.price, Product.description,
+                  Category.name, Product.active, main_image(ProductImage.filename),
+                  main_image(ProductImage.version), total_views,
+                  Product.created_at, Product.updated_at)
+        .outerjoin(Category, Category.id == Product.category_id)
+        .where(Product.created_by == user_id)
+        .order_by(Product.created_at, Product.id)
+    )
+
+def iter_batches(user_id, batch_size=500):
+    """Listas de productos (dicts con FIELDS) de batch_size en batch_size
+
+    Necesita un contexto de petición para construir las URLs públicas.
+    """
+    result = db.session.execute(export_query(user_id).execution_options(yield_per=batch_size))
+    for rows in result.partitions():
+        yield [{
+            'sku': sku,
+            'name': name,
+            'price': f'{price:.2f}',
+            'description': description or '',
+            'category': category or '',
+            'active': 1 if active else 0,
+            'image_url': ProductImage(product_id=product_id, filename=image, version=version).external_url
+                         if image else '',
+            'public_url': url_for('public.product_view', sku=sku, _external=True),
+            'total_views': int(total_views),
+            'created_at': created_at.isoformat(timespec='seconds') if created_at else '',
+            'updated_at': updated_at.isoformat(timespec='seconds') if updated_at else '',
+        } for product_id, sku, name, price, description, category, active, image, version, total_views,
+              created_at, updated_at in rows]
+
+def generate_export(user_id, fmt='csv', batch_size=500):
+    """Texto de la exportación, un trozo por bloque de productos"""
+    if fmt == 'jsonl':
+        for batch in iter_batches(user_id, batch_size):
+            yield ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in batch)
+        return
+
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=FIELDS)
+    # BOM para que Excel reconozca UTF-8 (la importación lo ignora)
+    buffer.write('\ufeff')
+    writer.writeheader()
+    yield buffer.getvalue()
+    for batch in iter_batches(user_id, batch_size):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(batch)
+        yield buffer.getvalue()
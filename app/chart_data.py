@@ -0,0 +1,62 @@
+"""
+Reducción de series para las gráficas del panel.
+
+El historial de precios es una función escalonada: entre dos cambios el precio
+no se mueve. compress_steps() quita primero los registros que repiten el
+precio anterior (p. ej. reglas automáticas que vuelven a guardar el mismo
+valor) sin perder ningún escalón. Si aun así quedan más puntos de los que la
+gráfica puede dibujar, lttb() (Largest-Triangle-Three-Buckets) elige en cada
+tramo el punto que más forma le da a la curva, conservando siempre el primero
+y el último.
+
+Los puntos son tuplas (x, y, ...) con x creciente; x suele ser un timestamp y
+los elementos extra se conservan tal cual.
+"""
+
+def compress_steps(points):
+    """Quita los puntos cuyo y repite el del punto anterior (conserva el último)"""
+    if len(points) <= 2:
+        return list(points)
+    result = [points[0]]
+    for point in points[1:-1]:
+        if point[1] != result[-1][1]:
+            result.append(point)
+    result.append(points[-1])
+    return result
+
+def lttb(points, threshold):
+    """Reduce la serie a `threshold` puntos con Largest-Triangle-Three-Buckets"""
+    if threshold >= len(points):
+        return list(points)
+    if threshold < 3:
+        return [points[0], points[-1]][:threshold]
+
+    sampled = [points[0]]
+    bucket_size = (len(points) - 2) / (threshold - 2)
+    a = 0  # índice del último punto elegido
+
+    for i in range(threshold - 2):
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+
+        # Promedio del tramo siguiente (el último tramo usa el punto final)
+        next_start = end
+        next_end = min(int((i + 2) * bucket_size) + 1, len(points))
+        if next_start >= next_end:
+            next_start, next_end = len(points) - 1, len(points)
+        count = next_end - next_start
+        avg_x = sum(p[0] for p in points[next_start:next_end]) / count
+        avg_y = sum(p[1] for p in points[next_start:next_end]) / count
+
+        # Punto del tramo actual que forma el triángulo de mayor área
+        ax, ay = points[a][0], points[a][1]
+        best, best_area = start, -1
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (points[j][1] - ay) - (ax - points[j][0]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        sampled.append(points[best])
+        a = best
+
+    sampled.append(points[-1])
+    return sampled
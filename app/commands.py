@@ -0,0 +1,284 @@
+"""
+Comandos de administración, disponibles con `flask <comando>`
+"""
+import os
+import click
+from datetime import datetime, timedelta
+from flask import current_app
+from app.models import db, Product, ProductImage, ProductViewDaily
+from app.page_cache import invalidate_product_pages
+
+def register_commands(app):
+    """Registra los comandos CLI en la aplicación"""
+    
+    @app.cli.command('backfill-view-rollup')
+    @click.option('--since', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+                  help='Reconstruir solo desde este día (YYYY-MM-DD). Por defecto, todo.')
+    def backfill_view_rollup(since):
+        """Reconstruye product_view_daily a partir de product_view"""
+        start_day = since.date() if since else None
+        
+        with db.engine.begin() as conn:
+            rows = ProductViewDaily.rebuild(conn, start_day)
+        
+        desde = f" desde {start_day}" if start_day else ""
+        click.echo(f"✓ Rollup de visitas reconstruido{desde}: {rows} filas producto/día")
+    
+    @app.cli.command('rebuild-search-index')
+    def rebuild_search_index():
+        """Reconstruye el índice de búsqueda de productos"""
+        from app.search import search_index
+        
+        if not search_index.enabled:
+            click.echo(f"✗ El índice de búsqueda no está disponible para {db.engine.dialect.name}")
+            return
+        
+        with db.engine.begin() as conn:
+            count = search_index.rebuild(conn)
+        click.echo(f"✓ Índice de búsqueda reconstruido: {count} productos")
+    
+    @app.cli.command('db-explain')
+    @click.option('--verbose', '-v', is_flag=True, help='Mostrar el plan completo de cada consulta.')
+    def db_explain(verbose):
+        """Revisa el plan de las consultas frecuentes y falla si alguna recorre una tabla completa"""
+        from app.query_plans import check_plans
+        
+        with db.engine.begin() as conn:
+            results = check_plans(conn)
+        
+        failures = 0
+        for name, plan, scans in results:
+            if scans:
+                failures += 1
+                click.echo(f"✗ {name}")
+                for step in scans:
+                    click.echo(f"    {step}")
+            else:
+                click.echo(f"✓ {name}")
+            if verbose:
+                for step in plan:
+                    click.echo(f"      {step}")
+        
+        if failures:
+            click.echo(f"\n✗ {failures} de {len(results)} consultas recorren una tabla completa "
+                       f"(¿falta ejecutar migrate_schema.py?)")
+            raise SystemExit(1)
+        click.echo(f"\n✓ {len(results)} consultas usan índices")
+    
+    @app.cli.group('analytics')
+    def analytics():
+        """Exportación columnar de visitas y precios, y reportes sobre ella"""
+    
+    @analytics.command('export')
+    @click.option('--since', type=click.DateTime(formats=['%Y-%m']), default=None,
+                  help='Reexportar desde este mes (YYYY-MM). Por defecto, desde el último mes exportado.')
+    @click.option('--full', is_flag=True, help='Reexportar todo el historial.')
+    def analytics_export(since, full):
+        """Copia product_view y price_history a archivos .npy por columna y mes"""
+        from app.analytics import TABLES, export_table, exported_months
+        
+        folder = current_app.config['ANALYTICS_FOLDER']
+        for table in TABLES:
+            start = None if full else since
+            if start is None and not full:
+                months = exported_months(folder, table)
+                start = datetime.strptime(months[-1], '%Y-%m') if months else None
+            
+            with db.engine.connect() as conn:
+                exported = export_table(conn, folder, table, start,
+                                        current_app.config['ANALYTICS_EXPORT_CHUNK'])
+            desde = f" desde {start:%Y-%m}" if start else ""
+            click.echo(f"✓ {table}{desde}: {sum(exported.values())} filas en {len(exported)} meses")
+            for month, rows in exported.items():
+                click.echo(f"    {month}: {rows}")
+    
+    @analytics.command('report')
+    @click.option('--days', type=int, default=30, help='Días hacia atrás (por defecto 30).')
+    @click.option('--user', 'user_id', type=int, default=None, help='Solo la tienda de este usuario.')
+    @click.option('--product', 'product_id', type=int, default=None, help='Solo este producto.')
+    @click.option('--limit', type=int, default=10, help='Productos en el ranking.')
+    def analytics_report(days, user_id, product_id, limit):
+        """Reporte de visitas sobre la última exportación (no consulta las tablas de visitas)"""
+        from app.analytics import AnalyticsReports, WEEKDAYS
+        from app.models import Product, User
+        
+        reports = AnalyticsReports(current_app.config['ANALYTICS_FOLDER'])
+        start = datetime.utcnow().date() - timedelta(days=days)
+        
+        if user_id is None and product_id is None:
+            totals = reports.tenant_totals(start)
+            emails = dict(db.session.query(User.id, User.email).filter(User.id.in_(totals)).all())
+            click.echo(f"Tiendas (últimos {days} días)")
+            for tenant, row in sorted(totals.items(), key=lambda item: -item[1]['views']):
+                click.echo(f"  {emails.get(tenant, tenant):<40} {row['views']:>8} visitas "
+                           f"{row['price_changes']:>6} cambios de precio")
+        
+        per_day = reports.views_per_day(start, user_id=user_id, product_id=product_id)
+        click.echo(f"\nVisitas por día: {sum(count for _, count in per_day)}")
+        for day, count in per_day:
+            click.echo(f"  {day}  {count:>8}")
+        
+        if product_id is None:
+            top = reports.top_products(start, user_id=user_id, limit=limit)
+            names = dict(db.session.query(Product.id, Product.name)
+                         .filter(Product.id.in_([pid for pid, _ in top])).all())
+            click.echo("\nProductos más vistos")
+            for pid, count in top:
+                click.echo(f"  {count:>8}  {names.get(pid, f'#{pid}')}")
+        
+        heatmap = reports.hour_heatmap(start, user_id=user_id, product_id=product_id)
+        width = max(len(str(heatmap.max())), 2)
+        click.echo("\nVisitas por hora (UTC)")
+        click.echo("     " + " ".join(f"{hour:>{width}}" for hour in range(24)))
+        for weekday, row in zip(WEEKDAYS, heatmap):
+            click.echo(f"  {weekday}" + "".join(f" {count:>{width}}" for count in row))
+    
+    @app.cli.command('import-products')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--user', 'email', required=True, help='Email del usuario dueño de los productos.')
+    @click.option('--images', 'image_folder', type=click.Path(exists=True, file_okay=False), default=None,
+                  help='Carpeta con las imágenes de la columna images.')
+    @click.option('--batch-size', type=int, default=None, help='Filas por transacción (por defecto IMPORT_BATCH_SIZE).')
+    @click.option('--dry-run', is_flag=True, help='Solo validar, sin escribir nada.')
+    def import_products(path, email, image_folder, batch_size, dry_run):
+        """Importa productos desde un CSV (o XLSX) por lotes"""
+        from app.models import User
+        from app.product_import import ProductImporter, read_rows
+        from app.image_pipeline import image_pipeline
+        
+        user = User.query.filter_by(email=email.lower()).first()
+        if user is None:
+            click.echo(f"✗ No existe el usuario {email}")
+            raise SystemExit(1)
+        
+        importer = ProductImporter(user.id,
+                                   image_folder=image_folder,
+                                   upload_folder=current_app.config['UPLOAD_FOLDER'],
+                                   batch_size=batch_size or current_app.config['IMPORT_BATCH_SIZE'],
+                                   dry_run=dry_run)
+        with open(path, 'rb') as f:
+            try:
+                result = importer.run(read_rows(f, path))
+            except ValueError as e:
+                click.echo(f"✗ {e}")
+                raise SystemExit(1)
+        
+        for line, message in result.errors:
+            click.echo(f"  línea {line}: {message}")
+        if result.error_count > len(result.errors):
+            click.echo(f"  … y {result.error_count - len(result.errors)} errores más")
+        
+        verbo = "se crearían" if dry_run else "creados"
+        click.echo(f"✓ {result.created} productos {verbo}, {result.skipped} ya existían, "
+                   f"{result.error_count} filas con errores")
+        if result.categories or result.images:
+            click.echo(f"✓ {result.categories} categorías nuevas, {result.images} imágenes")
+        if result.images:
+            # Esperar a que el pool termine de generar los derivados
+            image_pipeline.shutdown(wait=True)
+    
+    @app.cli.command('export-products')
+    @click.option('--user', 'email', required=True, help='Email del usuario dueño de los productos.')
+    @click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), default='csv')
+    @click.option('--output', '-o', default='-', help='Archivo de salida (por defecto, la salida estándar).')
+    @click.option('--base-url', required=True, help='URL pública de la aplicación, p. ej. https://tag2qr.shop')
+    def export_products(email, fmt, output, base_url):
+        """Exporta el catálogo de un usuario en CSV o JSON Lines"""
+        from app.models import User
+        from app.catalog_export import generate_export
+        
+        user = User.query.filter_by(email=email.lower()).first()
+        if user is None:
+            click.echo(f"✗ No existe el usuario {email}", err=True)
+            raise SystemExit(1)
+        
+        # Las URLs públicas se construyen como en una petición a base_url
+        with current_app.test_request_context(base_url=base_url):
+            with click.open_file(output, 'wb') as f:
+                for chunk in generate_export(user.id, fmt, current_app.config['EXPORT_BATCH_SIZE']):
+                    f.write(chunk.encode('utf-8'))
+    
+    @app.cli.command('process-pending-images')
+    @click.option('--all', 'all_images', is_flag=True,
+                  help='Regenerar también las imágenes ya procesadas (p. ej. tras cambiar los tamaños).')
+    def process_pending_images(all_images):
+        """Procesa las imágenes que quedaron en estado 'processing' o 'failed'"""
+        from app.utils import generate_image_derivatives
+        
+        query = ProductImage.query
+        if not all_images:
+            query = query.filter(ProductImage.status.in_(['processing', 'failed']))
+        images = query.all()
+        done = 0
+        for image in images:
+            image_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'products',
+                                      str(image.product_id), image.filename)
+            try:
+                result = generate_image_derivatives(image_path,
+                                                    current_app.config['MAX_IMAGE_WIDTH'],
+                                                    current_app.config['IMAGE_DERIVATIVES'],
+                                                    current_app.config['IMAGE_SRCSET_WIDTHS'],
+                                                    current_app.config['IMAGE_SRCSET_FORMATS'])
+                image.width = result['width']
+                image.formats = result['formats']
+                image.version = result['version']
+                image.status = 'ready'
+                done += 1
+            except Exception as e:
+                image.status = 'failed'
+                click.echo(f"✗ Imagen {image.id} ({image.filename}): {e}")
+        
+        db.session.commit()
+        
+        # Las páginas públicas pasan del marcador "procesando" a las variantes,
+        # como tras ImagePipeline._mark en la subida web
+        product_ids = list({image.product_id for image in images})
+        for i in range(0, len(product_ids), 500):
+            invalidate_product_pages(*db.session.scalars(
+                db.select(Product.sku).where(Product.id.in_(product_ids[i:i + 500]))
+            ))
+        click.echo(f"✓ {done} de {len(images)} imágenes procesadas")
+    
+    @app.cli.command('uploads-server-config')
+    @click.option('--server', type=click.Choice(['nginx', 'apache']), default='nginx',
+                  help='Servidor web que está delante de la aplicación.')
+    def uploads_server_config(server):
+        """Genera la configuración para que el servidor web sirva /uploads"""
+        upload_folder = os.path.abspath(current_app.config['UPLOAD_FOLDER'])
+        prefixes = current_app.config['UPLOADS_IMMUTABLE_PREFIXES']
+        max_age = current_app.config['UPLOADS_CACHE_MAX_AGE']
+        
+        lines = [f"# Generado con `flask uploads-server-config --server {server}`"]
+        if server == 'nginx':
+            # Públicos e inmutables: nginx los sirve sin pasar por Flask
+            for prefix in prefixes:
+                lines += [
+                    f"location /uploads/{prefix} {{",
+                    f"    alias {os.path.join(upload_folder, prefix)};",
+                    f"    add_header Cache-Control \"public, max-age={max_age}, immutable\";",
+                    "}",
+                ]
+            # El resto pasa por Flask, que responde con X-Accel-Redirect
+            accel_prefix = current_app.config['UPLOADS_ACCEL_PREFIX'].rstrip('/') + '/'
+            lines += [
+                "# UPLOADS_SERVE_MODE=x-accel",
+                f"location {accel_prefix} {{",
+                "    internal;",
+                f"    alias {upload_folder}/;",
+                "}",
+            ]
+        else:
+            for prefix in prefixes:
+                lines += [
+                    f"Alias /uploads/{prefix} {os.path.join(upload_folder, prefix)}",
+                    f"<Location /uploads/{prefix}>",
+                    "    PassengerEnabled off",
+                    f"    Header set Cache-Control \"public, max-age={max_age}, immutable\"",
+                    "</Location>",
+                ]
+            lines += [
+                "# UPLOADS_SERVE_MODE=x-sendfile (mod_xsendfile)",
+                "XSendFile On",
+                f"XSendFilePath {upload_folder}",
+            ]
+        click.echo('\n'.join(lines))
@@ -1,9 +1,10 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, TextAreaField, DecimalField, FileField, BooleanField, SelectField, IntegerField
+from wtforms import StringField, PasswordField, TextAreaField, DecimalField, FileField, BooleanField, SelectField, IntegerField, HiddenField
 from wtforms.validators import DataRequired, Email, Length, NumberRange, ValidationError, Optional
 from wtforms.widgets import TextArea
-from flask_wtf.file import FileAllowed
+from flask_wtf.file import FileAllowed, FileRequired
 from app.models import User, Product, Category
+from app.repricing import OPERATIONS
 
 class LoginForm(FlaskForm):
     email = StringField('Email', validators=[DataRequired(), Email()])
@@ -71,6 +72,42 @@ class CategoryForm(FlaskForm):
     description = TextAreaField('Descripción')
     active = BooleanField('Activa', default=True)
 
+class RepriceForm(FlaskForm):
+    """Cambio masivo de precios"""
+    scope = SelectField('Productos', choices=[
+        ('category', 'Una categoría'),
+        ('all', 'Todos mis productos'),
+        ('csv', 'Precios desde un archivo CSV'),
+    ], default='category')
+    category_id = SelectField('Categoría', coerce=int, validators=[Optional()])
+    operation = SelectField('Cambio', choices=list(OPERATIONS.items()), default='percent')
+    value = DecimalField('Valor', places=2)
+    round_99 = BooleanField('Redondear a .99')
+    csv_file = FileField('Archivo CSV (columnas sku y price)',
+                         validators=[FileAllowed(['csv', 'txt'], 'Solo se permiten archivos CSV')])
+    csv_data = HiddenField()
+    
+    def __init__(self, *args, user_id=None, product_ids=None, **kwargs):
+        super(RepriceForm, self).__init__(*args, **kwargs)
+        self.category_id.choices = [(0, '-- Sin categoría --')] + [
+            (c.id, c.name) for c in Category.query.filter_by(user_id=user_id).order_by(Category.name).all()
+        ]
+        # Selección manual desde el dashboard
+        if product_ids:
+            self.scope.choices = [('selection', f'Selección ({len(product_ids)} productos)')] + self.scope.choices
+    
+    def validate_value(self, field):
+        if self.scope.data != 'csv' and field.data is None:
+            raise ValidationError('Indica el valor del cambio.')
+
+class ProductImportForm(FlaskForm):
+    """Importación masiva de productos"""
+    file = FileField('Archivo CSV o XLSX', validators=[
+        FileRequired('Selecciona un archivo'),
+        FileAllowed(['csv', 'txt', 'xlsx'], 'Solo se permiten archivos CSV o XLSX')
+    ])
+    dry_run = BooleanField('Solo validar (no crear productos)')
+
 class StoreConfigForm(FlaskForm):
     name = StringField('Nombre de la Tienda', validators=[DataRequired(), Length(min=1, max=200)])
     phone = StringField('Teléfono', validators=[Optional(), Length(max=50)])
@@ -0,0 +1,94 @@
+"""
+Procesamiento de imágenes de productos en segundo plano.
+
+Las subidas se guardan en disco dentro de la petición y el trabajo de PIL
+(redimensionar + derivados) se envía a un pool de procesos: es CPU puro y en
+procesos aparte no compite por el GIL con los workers web. Mientras tanto la
+imagen queda en estado 'processing' y se sirve el original.
+"""
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from app.models import db, Product, ProductImage
+from app.page_cache import invalidate_product_pages
+from app.utils import generate_image_derivatives
+
+class ImagePipeline:
+    """Pool de procesos para generar los derivados de las imágenes"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['image_pipeline'] = self
+
+    def submit(self, image_id, image_path):
+        """Encola el procesado de una imagen ya guardada en disco"""
+        args = (
+            image_path,
+            self.app.config['MAX_IMAGE_WIDTH'],
+            self.app.config['IMAGE_DERIVATIVES'],
+            self.app.config['IMAGE_SRCSET_WIDTHS'],
+            self.app.config['IMAGE_SRCSET_FORMATS'],
+        )
+
+        if self.app.config['IMAGE_WORKERS'] <= 0:
+            # Sin pool: procesar en la propia petición
+            try:
+                result = generate_image_derivatives(*args)
+            except Exception as e:
+                self._mark(image_id, 'failed', error=e)
+            else:
+                self._mark(image_id, 'ready', result)
+            return
+
+        future = self._get_executor().submit(generate_image_derivatives, *args)
+        future.add_done_callback(lambda f: self._on_done(image_id, f))
+
+    def shutdown(self, wait=True):
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=wait)
+        self._executor = None
+
+    def _get_executor(self):
+        # Passenger hace fork después de cargar la app: un pool por proceso
+        pid = os.getpid()
+        with self._lock:
+            if self._executor is None or self._pid != pid:
+                self._executor = ProcessPoolExecutor(max_workers=self.app.config['IMAGE_WORKERS'])
+                self._pid = pid
+            return self._executor
+
+    def _on_done(self, image_id, future):
+        error = future.exception()
+        if error is not None:
+            self._mark(image_id, 'failed', error=error)
+        else:
+            self._mark(image_id, 'ready', future.result())
+
+    def _mark(self, image_id, status, values=None, error=None):
+        if error is not None:
+            self.app.logger.error(f"[image_pipeline] error procesando imagen {image_id}: {error}")
+        try:
+            with self.app.app_context():
+                db.session.execute(
+                    db.update(ProductImage)
+                    .where(ProductImage.id == image_id)
+                    .values(status=status, **(values or {}))
+                )
+                db.session.commit()
+                # La página pública pasa de la original a las variantes
+                sku = db.session.scalar(
+                    db.select(Product.sku).join(ProductImage).where(ProductImage.id == image_id)
+                )
+                invalidate_product_pages(sku)
+        except Exception as e:
+            self.app.logger.error(f"[image_pipeline] no se pudo actualizar la imagen {image_id}: {e}")
+
+image_pipeline = ImagePipeline()
@@ -1,12 +1,19 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from datetime import datetime
+from sqlalchemy.orm import validates
+from sqlalchemy.dialects import postgresql, sqlite
+from datetime import datetime, timedelta
 from werkzeug.security import generate_password_hash, check_password_hash
 from decimal import Decimal
 import os
+import re
 
 db = SQLAlchemy()
 
+def normalize_sku(sku):
+    """SKU canónico para búsquedas: sin espacios ni caracteres raros y en minúsculas"""
+    return re.sub(r'[^A-Za-z0-9\-_.]', '', (sku or '').strip()).lower()
+
 class Store(db.Model):
     """Configuración de la tienda"""
     __tablename__ = 'store'
@@ -66,6 +73,11 @@ class Store(db.Model):
 
 class Category(db.Model):
     """Categorías de productos"""
+    __table_args__ = (
+        # Categorías del usuario ordenadas por nombre
+        db.Index('ix_category_user_id_name', 'user_id', 'name'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     name = db.Column(db.String(100), nullable=False)
@@ -82,6 +94,11 @@ class Category(db.Model):
         return f'<Category {self.name}>'
 
 class User(UserMixin, db.Model):
+    __table_args__ = (
+        # Paginación por cursor de /admin_app/users
+        db.Index('ix_user_created_at_id', 'created_at', 'id'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(120), unique=True, nullable=False, index=True)
     password_hash = db.Column(db.String(128), nullable=False)
@@ -102,14 +119,28 @@ class User(UserMixin, db.Model):
         return f'<User {self.email}>'
 
 class Product(db.Model):
+    __table_args__ = (
+        # Búsqueda por SKU escaneado dentro de la tienda del usuario
+        db.Index('ix_product_created_by_sku_normalized', 'created_by', 'sku_normalized'),
+        # Paginación por cursor (created_at, id): dashboard y lista global
+        db.Index('ix_product_created_by_created_at_id', 'created_by', 'created_at', 'id'),
+        db.Index('ix_product_created_at_id', 'created_at', 'id'),
+        # Dashboard filtrado por categoría y conteo por categoría del usuario
+        db.Index('ix_product_created_by_category_id', 'created_by', 'category_id', 'created_at', 'id'),
+        # Productos de una categoría (p. ej. al eliminarla)
+        db.Index('ix_product_category_id', 'category_id'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     sku = db.Column(db.String(64), unique=True, nullable=False, index=True)
+    sku_normalized = db.Column(db.String(64), nullable=True)  # normalize_sku(sku), se asigna al escribir sku
     name = db.Column(db.String(200), nullable=False)
     slug = db.Column(db.String(200), nullable=False, index=True)
     description = db.Column(db.Text, nullable=True)
     price = db.Column(db.Numeric(10, 2), nullable=False)
     active = db.Column(db.Boolean, default=True, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relaciones
     created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -118,6 +149,12 @@ class Product(db.Model):
                            cascade='all, delete-orphan', 
                            order_by='ProductImage.order')
     
+    @validates('sku')
+    def _set_sku_normalized(self, key, sku):
+        # Las inserciones masivas con Core deben asignar sku_normalized ellas mismas
+        self.sku_normalized = normalize_sku(sku)
+        return sku
+    
     @property
     def main_image(self):
         """Obtiene la imagen principal (primera en orden)"""
@@ -142,14 +179,20 @@ class Product(db.Model):
     
     @property
     def total_views(self):
-        """Total de visitas al producto"""
-        return self.views.count()
+        """Total de visitas al producto (desde el rollup diario)"""
+        return db.session.query(
+            db.func.coalesce(db.func.sum(ProductViewDaily.count), 0)
+        ).filter(ProductViewDaily.product_id == self.id).scalar()
     
     def get_views_by_period(self, days=7):
-        """Obtiene visitas de los últimos N días"""
-        from datetime import timedelta
-        start_date = datetime.utcnow() - timedelta(days=days)
-        return self.views.filter(ProductView.viewed_at >= start_date).count()
+        """Obtiene visitas de los últimos N días (desde el rollup diario)"""
+        start_day = (datetime.utcnow() - timedelta(days=days)).date()
+        return db.session.query(
+            db.func.coalesce(db.func.sum(ProductViewDaily.count), 0)
+        ).filter(
+            ProductViewDaily.product_id == self.id,
+            ProductViewDaily.day >= start_day
+        ).scalar()
     
     def record_price_change(self, new_price, user_id=None):
         """Registra un cambio de precio"""
@@ -166,25 +209,92 @@ class Product(db.Model):
         return f'<Product {self.sku}: {self.name}>'
 
 class ProductImage(db.Model):
+    __table_args__ = (
+        # Imágenes de un producto en orden (relación Product.images)
+        db.Index('ix_product_image_product_id_order', 'product_id', 'order'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
     filename = db.Column(db.String(255), nullable=False)
     order = db.Column(db.Integer, default=0, nullable=False)
+    status = db.Column(db.String(20), default='ready', nullable=False)  # processing, ready, failed
+    width = db.Column(db.Integer)  # ancho de la original ya procesada (escalera srcset)
+    formats = db.Column(db.String(50))  # formatos de la escalera, p. ej. 'jpg,avif,webp'
+    version = db.Column(db.String(16))  # cambia en cada procesado (?v= en las URLs, caché inmutable)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    @property
+    def is_ready(self):
+        """Los derivados (redimensionado y thumbnail) ya existen"""
+        return self.status == 'ready'
+    
     @property
     def url(self):
         """URL completa de la imagen"""
+        return self._file_url(self.filename)
+    
+    @property
+    def external_url(self):
+        """URL absoluta de la imagen (exportaciones)"""
+        return self._file_url(self.filename, _external=True)
+    
+    def _file_url(self, filename, **kwargs):
+        # /uploads/products/ se sirve como inmutable, pero el procesado reescribe
+        # la original y los derivados con el mismo nombre: la versión va en la URL
         from flask import url_for
-        return url_for('uploaded_file', filename=f'products/{self.product_id}/{self.filename}')
+        return url_for('uploaded_file', filename=f'products/{self.product_id}/{filename}', v=self.version, **kwargs)
+    
+    def derivative_filename(self, suffix, ext='jpg'):
+        """Nombre del archivo derivado (p. ej. 'thumb' -> <nombre>_thumb.jpg)"""
+        name, _ = os.path.splitext(self.filename)
+        return f"{name}_{suffix}.{ext}"
+    
+    def derivative_url(self, suffix, ext='jpg'):
+        """URL de un derivado (la original mientras se procesa)"""
+        if not self.is_ready:
+            return self.url
+        return self._file_url(self.derivative_filename(suffix, ext))
     
     @property
     def thumbnail_url(self):
         """URL del thumbnail"""
-        from flask import url_for
-        name, ext = os.path.splitext(self.filename)
-        thumb_filename = f"{name}_thumb.jpg"
-        return url_for('uploaded_file', filename=f'products/{self.product_id}/{thumb_filename}')
+        return self.derivative_url('thumb')
+    
+    @property
+    def icon_url(self):
+        """URL de la miniatura para listas"""
+        return self.derivative_url('icon')
+    
+    @property
+    def srcset_formats(self):
+        """Formatos modernos disponibles para <source> (además del JPEG)"""
+        if not self.is_ready or not self.width or not self.formats:
+            return []
+        return [fmt for fmt in self.formats.split(',') if fmt != 'jpg']
+    
+    def srcset(self, fmt='jpg'):
+        """Valor del atributo srcset con la escalera de anchos en un formato
+        
+        Vacío si la imagen se procesó antes de existir la escalera (ver
+        `flask process-pending-images --all`) o si aún se está procesando.
+        """
+        from flask import current_app
+        if not self.is_ready or not self.width:
+            return ''
+        if fmt != 'jpg' and fmt not in self.srcset_formats:
+            return ''
+        
+        entries = [
+            f"{self.derivative_url(f'{width}w', fmt)} {width}w"
+            for width in current_app.config['IMAGE_SRCSET_WIDTHS']
+            if width < self.width
+        ]
+        # Las imágenes procesadas sin 'jpg' en formats no tienen la variante JPEG
+        # del ancho completo: se ofrece solo la escalera, nunca la original
+        if fmt != 'jpg' or 'jpg' in (self.formats or '').split(','):
+            entries.append(f"{self.derivative_url(f'{self.width}w', fmt)} {self.width}w")
+        return ', '.join(entries)
     
     def __repr__(self):
         return f'<ProductImage {self.filename} for Product {self.product_id}>'
@@ -192,6 +302,10 @@ class ProductImage(db.Model):
 class PriceHistory(db.Model):
     """Historial de cambios de precio"""
     __tablename__ = 'price_history'
+    __table_args__ = (
+        # Historial de un producto ordenado por fecha (gráfica de precios)
+        db.Index('ix_price_history_product_id_changed_at', 'product_id', 'changed_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id', ondelete='CASCADE'), nullable=False)
@@ -209,6 +323,9 @@ class PriceHistory(db.Model):
 class ProductView(db.Model):
     """Registro de visitas a productos mediante QR"""
     __tablename__ = 'product_view'
+    __table_args__ = (
+        db.Index('ix_product_view_product_viewed_at', 'product_id', 'viewed_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id', ondelete='CASCADE'), nullable=False)
@@ -220,4 +337,108 @@ class ProductView(db.Model):
     product = db.relationship('Product', backref=db.backref('views', lazy='dynamic', order_by='ProductView.viewed_at.desc()', cascade='all, delete-orphan'))
     
     def __repr__(self):
-        return f'<ProductView Product {self.product_id} at {self.viewed_at}>'
\ No newline at end of file
+        return f'<ProductView Product {self.product_id} at {self.viewed_at}>'
+
+class ProductViewDaily(db.Model):
+    """Visitas agregadas por producto y día (rollup de product_view)"""
+    __tablename__ = 'product_view_daily'
+    
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id', ondelete='CASCADE'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    unique_ips = db.Column(db.Integer, nullable=False, default=0)
+    
+    # Relaciones
+    product = db.relationship('Product', backref=db.backref('daily_views', lazy='dynamic', cascade='all, delete-orphan'))
+    
+    # Clave (pg_advisory_xact_lock(clave, product_id)) que serializa el recuento
+    # de un producto entre procesos en PostgreSQL
+    REFRESH_LOCK_KEY = 7001
+    
+    @staticmethod
+    def refresh(conn, product_ids, start_day, end_day):
+        """Recalcula el rollup de los productos dados entre dos días (inclusive)
+        
+        Se ejecuta en la misma transacción que inserta las visitas, de modo que
+        el rollup nunca queda desfasado respecto a product_view.
+        
+        Varios workers pueden escribir lotes del mismo producto y día a la vez:
+        - Las filas se escriben con INSERT ... ON CONFLICT DO UPDATE, así que
+          dos lotes que no encuentran la fila del día no chocan en la clave.
+        - En PostgreSQL se toma antes un bloqueo por producto hasta el final
+          de la transacción: el segundo lote espera al primero y su recuento
+          incluye las visitas ya confirmadas. En SQLite las transacciones de
+          escritura ya van de una en una.
+        """
+        product_ids = sorted(set(product_ids))
+        if not product_ids:
+            return
+        
+        dialect = conn.dialect.name
+        if dialect == 'postgresql':
+            # Siempre en el mismo orden, para que dos lotes no se bloqueen mutuamente
+            conn.execute(
+                db.text('SELECT pg_advisory_xact_lock(:key, :product_id)'),
+                [{'key': ProductViewDaily.REFRESH_LOCK_KEY, 'product_id': product_id} for product_id in product_ids]
+            )
+        
+        day = db.func.date(ProductView.viewed_at)
+        recount = db.select(
+            ProductView.product_id,
+            day,
+            db.func.count(ProductView.id),
+            db.func.count(db.distinct(ProductView.ip_address))
+        ).where(
+            ProductView.product_id.in_(product_ids),
+            ProductView.viewed_at >= datetime.combine(start_day, datetime.min.time()),
+            ProductView.viewed_at < datetime.combine(end_day + timedelta(days=1), datetime.min.time())
+        ).group_by(ProductView.product_id, day)
+        columns = ['product_id', 'day', 'count', 'unique_ips']
+        
+        insert = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}.get(dialect)
+        if insert is None:
+            # Otros motores: borrar y volver a insertar (sin protección frente a lotes simultáneos)
+            conn.execute(
+                db.delete(ProductViewDaily).where(
+                    ProductViewDaily.product_id.in_(product_ids),
+                    ProductViewDaily.day >= start_day,
+                    ProductViewDaily.day <= end_day
+                )
+            )
+            conn.execute(db.insert(ProductViewDaily).from_select(columns, recount))
+            return
+        
+        upsert = insert(ProductViewDaily).from_select(columns, recount)
+        conn.execute(upsert.on_conflict_do_update(
+            index_elements=['product_id', 'day'],
+            set_={'count': upsert.excluded['count'], 'unique_ips': upsert.excluded.unique_ips}
+        ))
+    
+    @staticmethod
+    def rebuild(conn, start_day=None):
+        """Reconstruye el rollup completo (o desde start_day) a partir de product_view"""
+        day = db.func.date(ProductView.viewed_at)
+        delete_stmt = db.delete(ProductViewDaily)
+        select_stmt = db.select(
+            ProductView.product_id,
+            day,
+            db.func.count(ProductView.id),
+            db.func.count(db.distinct(ProductView.ip_address))
+        ).group_by(ProductView.product_id, day)
+        
+        if start_day is not None:
+            delete_stmt = delete_stmt.where(ProductViewDaily.day >= start_day)
+            select_stmt = select_stmt.where(
+                ProductView.viewed_at >= datetime.combine(start_day, datetime.min.time())
+            )
+        
+        conn.execute(delete_stmt)
+        result = conn.execute(
+            db.insert(ProductViewDaily).from_select(
+                ['product_id', 'day', 'count', 'unique_ips'], select_stmt
+            )
+        )
+        return result.rowcount
+    
+    def __repr__(self):
+        return f'<ProductViewDaily Product {self.product_id} {self.day}: {self.count}>'
@@ -0,0 +1,187 @@
+"""
+Caché de páginas públicas renderizadas (/p/<sku>).
+
+La página de un producto solo cambia cuando el dueño lo edita, así que el HTML
+se guarda por SKU y se invalida explícitamente desde las vistas que lo
+modifican (ver invalidate_product_pages). Dos backends:
+
+- memory: LRU en memoria con TTL y tamaño máximo. Es por proceso, así que con
+  varios workers de Passenger la invalidación solo llega al proceso que la
+  hace; por eso /p/<sku> compara el ETag guardado con el actual (page_version)
+  antes de servir una entrada, y nunca sirve una página vieja.
+- filesystem: un archivo por página en PAGE_CACHE_DIR, compartido por todos
+  los workers (invalidación exacta).
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+class MemoryBackend:
+    """LRU en memoria con TTL"""
+
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+class FileSystemBackend:
+    """Un archivo JSON por página, compartido entre procesos"""
+
+    def __init__(self, directory, ttl):
+        self.directory = directory
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest()[:32] + '.json')
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            if os.path.getmtime(path) + self.ttl < time.time():
+                os.remove(path)
+                return None
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def set(self, key, value):
+        # Escritura atómica: otro worker nunca lee un archivo a medias
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(value, f)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        for filename in os.listdir(self.directory):
+            if filename.endswith('.json'):
+                os.remove(os.path.join(self.directory, filename))
+
+    def __len__(self):
+        return sum(1 for filename in os.listdir(self.directory) if filename.endswith('.json'))
+
+class PageCache:
+    """Caché de páginas con backend configurable y contadores de aciertos"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.backend = None
+        self._lock = threading.Lock()
+        self._counters = {
+            'hits': 0,
+            'misses': 0,
+            'invalidations': 0,
+        }
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        backend = app.config['PAGE_CACHE_BACKEND']
+        if backend == 'memory':
+            self.backend = MemoryBackend(app.config['PAGE_CACHE_TTL'], app.config['PAGE_CACHE_MAX_ENTRIES'])
+        elif backend == 'filesystem':
+            self.backend = FileSystemBackend(app.config['PAGE_CACHE_DIR'], app.config['PAGE_CACHE_TTL'])
+        else:
+            self.backend = None
+        app.extensions['page_cache'] = self
+
+    @property
+    def enabled(self):
+        return self.backend is not None
+
+    def get(self, key):
+        """Devuelve la entrada guardada (dict) o None"""
+        if not self.enabled:
+            return None
+        value = self.backend.get(key)
+        self._count('hits' if value is not None else 'misses')
+        return value
+
+    def set(self, key, value):
+        if self.enabled:
+            self.backend.set(key, value)
+
+    def delete(self, *keys):
+        if not self.enabled:
+            return
+        for key in set(keys):
+            if key:
+                self.backend.delete(key)
+                self._count('invalidations')
+
+    def clear(self):
+        if self.enabled:
+            self.backend.clear()
+
+    def stats(self):
+        """Contadores del proceso actual"""
+        with self._lock:
+            stats = dict(self._counters)
+        stats['backend'] = self.app.config['PAGE_CACHE_BACKEND'] if self.app else None
+        stats['entries'] = len(self.backend) if self.enabled else 0
+        return stats
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+page_cache = PageCache()
+
+def invalidate_product_pages(*skus):
+    """Invalida la página pública de uno o varios productos (por SKU)"""
+    page_cache.delete(*skus)
+
+def invalidate_owner_pages(user_id):
+    """Invalida las páginas de todos los productos de un usuario"""
+    from app.models import Product
+    if not page_cache.enabled:
+        return
+    skus = [sku for (sku,) in Product.query.with_entities(Product.sku).filter_by(created_by=user_id)]
+    page_cache.delete(*skus)
@@ -0,0 +1,127 @@
+"""
+Paginación por cursor (keyset) para las listas del panel.
+
+paginate() con OFFSET lee y descarta todas las filas anteriores a la página y
+hace además un COUNT(*) completo en cada petición, así que las páginas del
+final son cada vez más lentas. Aquí cada página continúa desde la última fila
+de la anterior con WHERE (created_at, id) < (:created_at, :id), que resuelve
+el índice compuesto correspondiente sin importar lo lejos que esté.
+
+Los cursores son opacos para el cliente (JSON en base64 url-safe). El total,
+cuando se muestra, sale de un COUNT(*) cacheado unos segundos por lista.
+"""
+import base64
+import json
+from datetime import datetime
+from flask import current_app
+from app.models import db
+from app.page_cache import MemoryBackend
+
+class KeysetPage:
+    """Una página de resultados con los cursores para moverse a sus vecinas"""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None, total=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+def encode_cursor(direction, values):
+    """Cursor opaco: dirección ('after' | 'before' | 'offset') y valores"""
+    payload = json.dumps(
+        [direction, [value.isoformat() if isinstance(value, datetime) else value for value in values]],
+        separators=(',', ':')
+    )
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, columns=()):
+    """Devuelve (dirección, valores) o (None, None) si el cursor no es válido"""
+    if not cursor:
+        return None, None
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        direction, values = json.loads(payload)
+        if direction == 'offset' and not columns:
+            return direction, [max(int(values[0]), 0)]
+        if direction not in ('after', 'before') or len(values) != len(columns):
+            return None, None
+        return direction, [
+            datetime.fromisoformat(value) if isinstance(column.type, db.DateTime) else value
+            for column, value in zip(columns, values)
+        ]
+    except (ValueError, TypeError, IndexError):
+        return None, None
+
+def keyset_paginate(query, columns, cursor=None, per_page=20, total=None):
+    """Página de la consulta ordenada de forma descendente por columns
+
+    columns debe terminar en una columna única (normalmente el id) para que
+    el orden sea total. La consulta no debe traer su propio order_by.
+    """
+    direction, values = decode_cursor(cursor, columns)
+    backwards = direction == 'before'
+
+    key = db.tuple_(*columns)
+    if values is not None:
+        bound = db.tuple_(*[db.literal(value, column.type) for column, value in zip(columns, values)])
+        query = query.filter(key > bound if backwards else key < bound)
+
+    order = [column.asc() if backwards else column.desc() for column in columns]
+    items = query.order_by(*order).limit(per_page + 1).all()
+
+    # La fila extra solo indica si hay más en la dirección en la que se avanza
+    has_more = len(items) > per_page
+    items = items[:per_page]
+    if backwards:
+        items.reverse()
+
+    def cursor_for(direction, item):
+        return encode_cursor(direction, [getattr(item, column.key) for column in columns])
+
+    next_cursor = prev_cursor = None
+    if items:
+        if has_more or backwards:
+            next_cursor = cursor_for('after', items[-1])
+        if (has_more and backwards) or direction == 'after':
+            prev_cursor = cursor_for('before', items[0])
+
+    return KeysetPage(items, next_cursor, prev_cursor, total)
+
+def offset_paginate(query, cursor=None, per_page=20, total=None):
+    """Página por OFFSET con los mismos cursores opacos
+
+    Para consultas cuyo orden no sirve como clave de búsqueda (p. ej. por
+    relevancia de texto completo); son resultados acotados por el filtro.
+    """
+    direction, values = decode_cursor(cursor)
+    offset = values[0] if direction == 'offset' else 0
+
+    items = query.offset(offset).limit(per_page + 1).all()
+    next_cursor = encode_cursor('offset', [offset + per_page]) if len(items) > per_page else None
+    prev_cursor = encode_cursor('offset', [max(offset - per_page, 0)]) if offset > 0 else None
+    return KeysetPage(items[:per_page], next_cursor, prev_cursor, total)
+
+_count_cache = None
+
+def cached_count(query, key):
+    """COUNT(*) de la consulta, cacheado PAGINATION_COUNT_TTL segundos por clave
+
+    Es un total aproximado: las altas y bajas aparecen cuando expira.
+    """
+    global _count_cache
+    if _count_cache is None:
+        _count_cache = MemoryBackend(current_app.config['PAGINATION_COUNT_TTL'], 1000)
+
+    total = _count_cache.get(key)
+    if total is None:
+        total = query.order_by(None).count()
+        _count_cache.set(key, total)
+    return total
@@ -0,0 +1,272 @@
+"""
+Importación masiva de productos desde CSV (o XLSX, si openpyxl está instalado).
+
+El archivo se lee fila a fila y se procesa por lotes de IMPORT_BATCH_SIZE
+filas, cada lote en su propia transacción:
+
+1. Validación con las reglas de ProductForm (nombre, SKU, precio > 0).
+2. Una consulta por lote al índice de sku para descartar los que ya existen
+   (y un set para los repetidos dentro del archivo). Volver a ejecutar una
+   importación cortada a medias continúa donde se quedó. Los SKU de otra
+   tienda se informan como errores de la fila.
+3. INSERT en bloque de product y del precio inicial en price_history, y
+   reindexado de la búsqueda (los INSERT en bloque no pasan por el flush del
+   ORM, así que sku_normalized y el índice se rellenan aquí).
+4. Opcionalmente, las imágenes de la columna images se copian desde una
+   carpeta local y se envían al pool de procesos de image_pipeline.
+
+Columnas (encabezado obligatorio, en español o inglés): name, price, y
+opcionalmente sku, description, category, active e images (nombres de
+archivo separados por |). Un SKU vacío se genera como en el formulario.
+"""
+import codecs
+import os
+import re
+import shutil
+import uuid
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from werkzeug.security import safe_join
+from app.models import db, Product, ProductImage, PriceHistory, Category, normalize_sku
+from app.search import search_index, typeahead_index, normalize_search_text
+from app.utils import read_csv_rows, generate_sku, allowed_file
+
+# Campo -> nombres aceptados en el encabezado (sin tildes, en minúsculas)
+COLUMNS = {
+    'sku': ('sku',),
+    'name': ('name', 'nombre'),
+    'price': ('price', 'precio'),
+    'description': ('description', 'descripcion'),
+    'category': ('category', 'categoria'),
+    'active': ('active', 'activo'),
+    'images': ('images', 'imagenes'),
+}
+
+INACTIVE_VALUES = {'0', 'no', 'n', 'false', 'falso', 'inactivo'}
+MAX_ERRORS = 200
+
+class ImportResult:
+    """Resumen de una importación"""
+
+    def __init__(self):
+        self.created = 0
+        self.skipped = 0  # SKU ya existente en los productos del usuario
+        self.categories = 0
+        self.images = 0
+        self.error_count = 0
+        self.errors = []  # (línea, mensaje), como máximo MAX_ERRORS
+
+    def error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append((line, message))
+
+def read_rows(stream, filename):
+    """Filas (listas de texto) de un archivo abierto en binario, encabezado incluido"""
+    if filename.lower().endswith('.xlsx'):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise ValueError('Para importar archivos .xlsx hay que instalar openpyxl (o exportar a CSV)')
+        sheet = load_workbook(stream, read_only=True, data_only=True).active
+        return (['' if value is None else str(value) for value in row]
+                for row in sheet.iter_rows(values_only=True))
+    return read_csv_rows(codecs.iterdecode(stream, 'utf-8-sig'))
+
+def _category_slug(name, used):
+    slug = re.sub(r'[^\w\s-]', '', name.lower())
+    slug = re.sub(r'[-\s]+', '-', slug).strip('-') or 'categoria'
+    candidate, suffix = slug, 1
+    while candidate in used:
+        suffix += 1
+        candidate = f'{slug}-{suffix}'
+    used.add(candidate)
+    return candidate
+
+def _parse_row(row, columns, line, result):
+    """Valida una fila con las reglas de ProductForm; devuelve un dict o None"""
+    def value(field):
+        index = columns.get(field)
+        return row[index].strip() if index is not None and index < len(row) else ''
+
+    name = value('name')
+    if not name or len(name) > 200:
+        result.error(line, 'el nombre es obligatorio (máximo 200 caracteres)')
+        return None
+    sku = value('sku') or generate_sku()
+    if len(sku) > 64:
+        result.error(line, f'SKU demasiado largo: {sku[:64]}…')
+        return None
+    try:
+        price = Decimal(value('price').replace(',', '.')).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    except InvalidOperation:
+        result.error(line, f'precio no válido: {value("price")!r}')
+        return None
+    if not Decimal('0.01') <= price <= Decimal('99999999.99'):
+        result.error(line, f'precio fuera de rango: {price}')
+        return None
+    category = value('category')[:100]
+
+    return {
+        'line': line,
+        'sku': sku,
+        'name': name,
+        'price': price,
+        'description': value('description') or None,
+        'category': category,
+        'active': value('active').lower() not in INACTIVE_VALUES,
+        'images': [filename.strip() for filename in value('images').split('|') if filename.strip()],
+    }
+
+class ProductImporter:
+    """Importa filas de productos para un usuario, por lotes"""
+
+    def __init__(self, user_id, image_folder=None, upload_folder=None, batch_size=500, dry_run=False):
+        self.user_id = user_id
+        self.image_folder = image_folder
+        self.upload_folder = upload_folder
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.result = ImportResult()
+        self._seen = set()
+        categories = db.session.execute(
+            db.select(Category.id, Category.name, Category.slug).where(Category.user_id == user_id)
+        ).all()
+        self._categories = {normalize_search_text(name): category_id for category_id, name, _ in categories}
+        self._category_slugs = {slug for _, _, slug in categories}
+
+    def run(self, rows):
+        """Procesa todas las filas (la primera es el encabezado) y devuelve el ImportResult"""
+        rows = iter(rows)
+        header = [normalize_search_text(column.strip()) for column in next(rows, [])]
+        columns = {}
+        for field, aliases in COLUMNS.items():
+            for alias in aliases:
+                if alias in header:
+                    columns[field] = header.index(alias)
+                    break
+        if 'name' not in columns or 'price' not in columns:
+            raise ValueError('El archivo debe tener una fila de encabezado con al menos las columnas "name" y "price" '
+                             '(o "nombre" y "precio")')
+
+        batch = []
+        for line, row in enumerate(rows, start=2):
+            if not any(cell.strip() for cell in row):
+                continue
+            record = _parse_row(row, columns, line, self.result)
+            if record is None:
+                continue
+            if record['sku'] in self._seen:
+                self.result.error(line, f'SKU repetido en el archivo: {record["sku"]}')
+                continue
+            self._seen.add(record['sku'])
+            batch.append(record)
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+        if batch:
+            self._write(batch)
+
+        if self.result.created and not self.dry_run:
+            typeahead_index.invalidate(self.user_id)
+        return self.result
+
+    def _write(self, batch):
+        """Inserta un lote en una transacción"""
+        # sku es único entre todas las tiendas: los del usuario se omiten y los
+        # de otra tienda son errores de la fila
+        owners = dict(db.session.execute(
+            db.select(Product.sku, Product.created_by).where(Product.sku.in_([record['sku'] for record in batch]))
+        ).all())
+        for record in batch:
+            if record['sku'] not in owners:
+                continue
+            if owners[record['sku']] == self.user_id:
+                self.result.skipped += 1
+            else:
+                self.result.error(record['line'], f'el SKU {record["sku"]} ya lo usa otra tienda')
+        batch = [record for record in batch if record['sku'] not in owners]
+        if self.dry_run or not batch:
+            self.result.created += len(batch)
+            return
+
+        copied = []
+        pending_images = []
+        try:
+            for record in batch:
+                record['category_id'] = self._category_id(record['category'])
+
+            product_ids = db.session.scalars(
+                db.insert(Product).returning(Product.id, sort_by_parameter_order=True),
+                [{
+                    'sku': record['sku'],
+                    'sku_normalized': normalize_sku(record['sku']),
+                    'name': record['name'],
+                    'slug': record['name'].lower().replace(' ', '-'),
+                    'description': record['description'],
+                    'price': record['price'],
+                    'active': record['active'],
+                    'category_id': record['category_id'],
+                    'created_by': self.user_id,
+                } for record in batch]
+            ).all()
+            db.session.execute(db.insert(PriceHistory), [
+                {'product_id': product_id, 'price': record['price'], 'changed_by': self.user_id}
+                for product_id, record in zip(product_ids, batch)
+            ])
+            search_index.reindex(db.session.connection(), product_ids)
+            if self.image_folder:
+                pending_images = self._attach_images(zip(product_ids, batch), copied)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            for image_path in copied:
+                if os.path.exists(image_path):
+                    os.remove(image_path)
+            raise
+
+        self.result.created += len(product_ids)
+        if pending_images:
+            from app.image_pipeline import image_pipeline
+            for image_id, image_path in pending_images:
+                image_pipeline.submit(image_id, image_path)
+            self.result.images += len(pending_images)
+
+    def _category_id(self, name):
+        """Id de la categoría por nombre (sin distinguir tildes ni mayúsculas); la crea si no existe"""
+        if not name:
+            return None
+        key = normalize_search_text(name)
+        if key not in self._categories:
+            category = Category(user_id=self.user_id, name=name,
+                                slug=_category_slug(name, self._category_slugs))
+            db.session.add(category)
+            db.session.flush()
+            self._categories[key] = category.id
+            self.result.categories += 1
+        return self._categories[key]
+
+    def _attach_images(self, products, copied):
+        """Copia las imágenes de la carpeta local y crea sus filas; devuelve [(image_id, ruta)]
+
+        Las rutas copiadas se añaden a `copied` para borrarlas si el lote falla.
+        """
+        rows = []
+        for product_id, record in products:
+            product_dir = os.path.join(self.upload_folder, 'products', str(product_id))
+            for order, filename in enumerate(record['images'], start=1):
+                source = safe_join(self.image_folder, filename)
+                if source is None or not allowed_file(source) or not os.path.isfile(source):
+                    self.result.error(record['line'], f'imagen no encontrada o no permitida: {filename}')
+                    continue
+                os.makedirs(product_dir, exist_ok=True)
+                target = os.path.join(product_dir, f'{uuid.uuid4().hex}{os.path.splitext(source)[1].lower()}')
+                shutil.copyfile(source, target)
+                copied.append(target)
+                rows.append({'product_id': product_id, 'filename': os.path.basename(target),
+                             'order': order, 'status': 'processing'})
+        if not rows:
+            return []
+        image_ids = db.session.scalars(
+            db.insert(ProductImage).returning(ProductImage.id, sort_by_parameter_order=True), rows
+        ).all()
+        return list(zip(image_ids, copied))
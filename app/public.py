@@ -1,6 +1,12 @@
-from flask import Blueprint, render_template, abort, url_for, request, redirect
+from flask import Blueprint, render_template, abort, url_for, request, redirect, make_response, current_app
 from flask_login import current_user
-from app.models import Product, ProductView, db
+from flask_wtf.csrf import generate_csrf
+from app.models import Product, ProductImage, Store, db
+from app.view_tracking import view_tracker
+from app.page_cache import page_cache
+from functools import lru_cache
+import hashlib
+import os
 
 public_bp = Blueprint('public', __name__)
 
@@ -11,25 +17,87 @@ def index():
         return redirect(url_for('admin.dashboard'))
     return render_template('public/index.html')
 
+# Marcador del token CSRF en el HTML cacheado (el token es por sesión)
+CSRF_PLACEHOLDER = '__csrf_token__'
+
+# Plantillas que componen la página pública (su fecha entra en el ETag)
+PRODUCT_PAGE_TEMPLATES = ('public/product.html', 'base.html', 'image_macros.html')
+
+@lru_cache(maxsize=1)
+def _templates_stamp():
+    """Cambia al desplegar plantillas nuevas, para no servir 304 de HTML viejo"""
+    folder = os.path.join(current_app.root_path, current_app.template_folder)
+    return str(max(os.path.getmtime(os.path.join(folder, name)) for name in PRODUCT_PAGE_TEMPLATES))
+
+def page_version(sku):
+    """(product_id, etag) de la página pública de un producto activo, o None
+    
+    Una sola consulta ligera (producto + tienda + imágenes) permite responder
+    304 sin cargar el producto ni renderizar la plantilla.
+    """
+    rows = db.session.execute(
+        db.select(Product.id, Product.updated_at, Store.updated_at,
+                  ProductImage.id, ProductImage.status, ProductImage.version)
+        .outerjoin(Store, Store.user_id == Product.created_by)
+        .outerjoin(ProductImage, ProductImage.product_id == Product.id)
+        .where(Product.sku == sku, Product.active.is_(True))
+        .order_by(ProductImage.order, ProductImage.id)
+    ).all()
+    if not rows:
+        return None
+    stamp = repr([tuple(row) for row in rows]) + _templates_stamp()
+    return rows[0][0], hashlib.sha256(stamp.encode()).hexdigest()[:32]
+
+def _page_response(body, etag, status=200):
+    response = make_response(body, status)
+    response.set_etag(etag)
+    # Lleva el token CSRF de la sesión: solo caché del navegador, revalidando
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
 @public_bp.route('/p/<string:sku>')
 def product_view(sku):
     """Vista pública del producto optimizada para móvil"""
-    product = Product.query.filter_by(sku=sku, active=True).first()
-    if not product:
+    # La consulta ligera va en cada petición: comprueba que el producto sigue
+    # existiendo y activo y da el ETag actual. La caché en memoria es por
+    # proceso y no se entera de los cambios hechos en otros workers: una
+    # entrada con otro ETag está desfasada y se vuelve a renderizar
+    version = page_version(sku)
+    if version is None:
         abort(404)
+    product_id, etag = version
     
-    # Registrar visita
-    view = ProductView(
-        product_id=product.id,
+    # Registrar visita (en segundo plano, sin esperar a la base de datos),
+    # también cuando el navegador ya tiene la página
+    view_tracker.record(
+        product_id,
         ip_address=request.remote_addr,
-        user_agent=request.headers.get('User-Agent', '')[:255]
+        user_agent=request.headers.get('User-Agent', '')
     )
-    db.session.add(view)
-    db.session.commit()
     
-    # URL para compartir
-    share_url = url_for('public.product_view', sku=sku, _external=True)
+    if request.if_none_match.contains_weak(etag):
+        return _page_response('', etag, status=304)
+    
+    cached = page_cache.get(sku)
+    if cached is not None and (cached['host'] != request.host or cached['etag'] != etag):
+        cached = None
+    
+    if cached is None:
+        product = db.session.get(Product, product_id)
+        
+        # URL para compartir
+        share_url = url_for('public.product_view', sku=sku, _external=True)
+        
+        html = render_template('public/product.html', 
+                             product=product, 
+                             share_url=share_url)
+        cached = {
+            'host': request.host,
+            'product_id': product_id,
+            'etag': etag,
+            'html': html.replace(generate_csrf(), CSRF_PLACEHOLDER),
+        }
+        page_cache.set(sku, cached)
     
-    return render_template('public/product.html', 
-                         product=product, 
-                         share_url=share_url)
\ No newline at end of file
+    return _page_response(cached['html'].replace(CSRF_PLACEHOLDER, generate_csrf()), etag)
\ No newline at end of file
@@ -1,116 +1,351 @@
-from flask import Blueprint, send_file, url_for, render_template, current_app
+from flask import Blueprint, send_file, url_for, render_template, current_app, request, flash, redirect
 from flask_login import login_required, current_user
-from app.models import Product
+from app.models import Product, Store
 import qrcode
 from io import BytesIO
+from urllib.parse import quote
+import base64
+import glob
+import hashlib
 import os
+import uuid
 
 qr_bp = Blueprint('qr', __name__, url_prefix='/admin')
 
+ERROR_CORRECTION_LEVELS = {
+    'L': qrcode.constants.ERROR_CORRECT_L,
+    'M': qrcode.constants.ERROR_CORRECT_M,
+    'Q': qrcode.constants.ERROR_CORRECT_Q,
+    'H': qrcode.constants.ERROR_CORRECT_H,
+}
+
+# Tamaños de papel (ancho, alto) en mm para la hoja de etiquetas
+PAPER_SIZES_MM = {
+    'a4': (210, 297),
+    'letter': (215.9, 279.4),
+}
+SHEET_MARGIN_MM = 8
+LABEL_GAP_MM = 2
+
+def _qr_options():
+    """Parámetros de renderizado del QR tomados de la configuración"""
+    config = current_app.config
+    return {
+        'error_correction': config['QR_ERROR_CORRECTION'],
+        'box_size': config['QR_BOX_SIZE'],
+        'border': config['QR_BORDER'],
+        'fill_color': config['QR_FILL_COLOR'],
+        'back_color': config['QR_BACK_COLOR'],
+    }
+
+def _product_qr_payload(product_sku):
+    """Contenido del QR: URL pública del producto"""
+    return url_for('public.product_view', sku=product_sku, _external=True)
+
+def qr_cache_key(payload, options=None, fmt='png'):
+    """Hash del contenido, formato y parámetros del QR (clave del cache en disco)"""
+    options = options or _qr_options()
+    raw = '|'.join(str(value) for value in (
+        payload,
+        fmt,
+        options['error_correction'],
+        options['box_size'],
+        options['border'],
+        options['fill_color'],
+        options['back_color'],
+    ))
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32]
+
+def qr_version(product, fmt='png'):
+    """Versión del QR de un producto, usada para versionar su URL"""
+    return qr_cache_key(_product_qr_payload(product.sku), fmt=fmt)
+
+def qr_print_format():
+    """Formato del QR para impresión: ?format= en la URL o QR_PRINT_FORMAT"""
+    fmt = request.args.get('format') or current_app.config['QR_PRINT_FORMAT']
+    return fmt if fmt in QR_FORMATS else 'png'
+
+def _build_qr(payload, options):
+    """Construye el código QR con los parámetros indicados"""
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=ERROR_CORRECTION_LEVELS[options['error_correction']],
+        box_size=options['box_size'],
+        border=options['border'],
+    )
+    qr.add_data(payload)
+    qr.make(fit=True)
+    return qr
+
+def _render_qr_png(payload, options):
+    """Renderiza el QR como PNG y devuelve los bytes"""
+    qr = _build_qr(payload, options)
+    img = qr.make_image(fill_color=options['fill_color'], back_color=options['back_color'])
+    img_buffer = BytesIO()
+    img.save(img_buffer, format='PNG')
+    return img_buffer.getvalue()
+
+def _render_qr_svg(payload, options):
+    """Renderiza el QR como SVG vectorial (sin rasterizar) y devuelve los bytes
+    
+    SvgPathImage de qrcode emite un subpath por módulo (~5 KB por etiqueta);
+    aquí cada tramo horizontal de módulos oscuros es un único trazo, lo que
+    deja el SVG por debajo de 2 KB.
+    """
+    qr = _build_qr(payload, options)
+    border = options['border']
+    size = qr.modules_count + 2 * border
+    
+    segments = []
+    for y, row in enumerate(qr.modules):
+        x = 0
+        while x < len(row):
+            if row[x]:
+                start = x
+                while x < len(row) and row[x]:
+                    x += 1
+                segments.append(f'M{start + border} {y + border}.5h{x - start}')
+            else:
+                x += 1
+    
+    svg = (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {size} {size}" '
+        f'shape-rendering="crispEdges">'
+        f'<rect width="100%" height="100%" fill="{options["back_color"]}"/>'
+        f'<path stroke="{options["fill_color"]}" d="{"".join(segments)}"/>'
+        f'</svg>'
+    )
+    return svg.encode('utf-8')
+
+# Formatos soportados: renderizador y mimetype
+QR_FORMATS = {
+    'png': (_render_qr_png, 'image/png'),
+    'svg': (_render_qr_svg, 'image/svg+xml'),
+}
+
 @qr_bp.route('/product/<int:product_id>/qr')
 @login_required
 def product_qr_view(product_id):
     """Mostrar página con QR y opciones de impresión"""
     product = Product.query.filter_by(id=product_id, created_by=current_user.id).first_or_404()
-    qr_url = url_for('qr.product_qr_image', product_id=product_id)
+    qr_url = url_for('qr.product_qr_image', product_id=product_id, v=qr_version(product))
+    qr_svg_url = url_for('qr.product_qr_svg', product_id=product_id, v=qr_version(product, 'svg'))
     print_url = url_for('qr.print_ticket', product_id=product_id)
     
     return render_template('admin/product_qr.html', 
                          product=product, 
                          qr_url=qr_url,
+                         qr_svg_url=qr_svg_url,
                          print_url=print_url)
 
 @qr_bp.route('/product/<int:product_id>/qr.png')
 @login_required
 def product_qr_image(product_id):
-    """Generar y servir imagen QR"""
+    """Servir imagen QR (PNG) desde el cache en disco"""
     product = Product.query.filter_by(id=product_id, created_by=current_user.id).first_or_404()
+    return _send_product_qr(product, 'png')
+
+@qr_bp.route('/product/<int:product_id>/qr.svg')
+@login_required
+def product_qr_svg(product_id):
+    """Servir imagen QR vectorial (SVG) desde el cache en disco"""
+    product = Product.query.filter_by(id=product_id, created_by=current_user.id).first_or_404()
+    return _send_product_qr(product, 'svg')
+
+def _send_product_qr(product, fmt):
+    """Respuesta con el QR del producto, generándolo si no está en cache"""
+    render, mimetype = QR_FORMATS[fmt]
+    download_name = f'qr_{product.sku}.{fmt}'
     
-    # Construir URL pública del producto
-    public_url = url_for('public.product_view', sku=product.sku, _external=True)
-    
-    # Generar QR
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(public_url)
-    qr.make(fit=True)
+    filename = save_qr_image(product.id, product.sku, fmt)
+    if not filename:
+        # Fallback: generar en memoria si no se pudo escribir el cache
+        data = render(_product_qr_payload(product.sku), _qr_options())
+        return send_file(BytesIO(data),
+                        mimetype=mimetype,
+                        as_attachment=False,
+                        download_name=download_name)
     
-    # Crear imagen
-    img = qr.make_image(fill_color="black", back_color="white")
+    key = os.path.splitext(filename)[0].rsplit('_', 1)[-1]
+    response = send_file(os.path.join(current_app.config['QR_FOLDER'], filename),
+                        mimetype=mimetype,
+                        as_attachment=False,
+                        download_name=download_name,
+                        etag=key,
+                        conditional=True)
     
-    # Guardar en memoria
-    img_buffer = BytesIO()
-    img.save(img_buffer, format='PNG')
-    img_buffer.seek(0)
+    if request.args.get('v') == key:
+        # URL versionada con el hash del contenido: nunca cambia
+        response.cache_control.no_cache = None
+        response.cache_control.private = True
+        response.cache_control.max_age = current_app.config['QR_CACHE_MAX_AGE']
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
     
-    return send_file(img_buffer, 
-                    mimetype='image/png',
-                    as_attachment=False,
-                    download_name=f'qr_{product.sku}.png')
+    return response
 
 @qr_bp.route('/product/<int:product_id>/print-ticket')
 @login_required
 def print_ticket(product_id):
     """Plantilla imprimible para etiqueta/ticket"""
-    from app.models import Store
-    
     product = Product.query.filter_by(id=product_id, created_by=current_user.id).first_or_404()
-    qr_url = url_for('qr.product_qr_image', product_id=product_id, _external=True)
+    
+    # SVG por defecto (nítido a cualquier tamaño); PNG como alternativa
+    qr_format = qr_print_format()
+    endpoint = 'qr.product_qr_svg' if qr_format == 'svg' else 'qr.product_qr_image'
+    qr_url = url_for(endpoint, product_id=product_id,
+                     v=qr_version(product, qr_format), _external=True)
     
     # Obtener configuración de la tienda del usuario actual
     store = Store.get_store(current_user.id)
     
-    # Calcular tamaño exacto del QR en mm basado en el porcentaje y las dimensiones
+    return render_template('admin/print_ticket.html', 
+                         product=product, 
+                         qr_url=qr_url,
+                         qr_format=qr_format,
+                         store=store,
+                         qr_size_mm=_label_qr_size_mm(store))
+
+@qr_bp.route('/print-sheet', methods=['GET', 'POST'])
+@login_required
+def print_sheet():
+    """Hoja imprimible con varias etiquetas por página"""
+    store = Store.get_store(current_user.id)
+    
+    product_ids = request.values.getlist('ids', type=int)
+    category_id = request.values.get('category', type=int)
+    scope = request.values.get('scope', '')
+    paper = request.values.get('paper', 'a4')
+    if paper not in PAPER_SIZES_MM:
+        paper = 'a4'
+    
+    query = Product.query.filter_by(created_by=current_user.id)
+    if scope == 'active':
+        query = query.filter_by(active=True)
+    elif category_id:
+        query = query.filter_by(category_id=category_id, active=True)
+    elif product_ids:
+        # Selección manual desde el dashboard
+        query = query.filter(Product.id.in_(product_ids))
+    else:
+        flash('Selecciona los productos a imprimir', 'warning')
+        return redirect(url_for('admin.dashboard'))
+    
+    total_labels = query.count()
+    if not total_labels:
+        flash('No hay productos para imprimir', 'warning')
+        return redirect(url_for('admin.dashboard'))
+    
+    # Como máximo PRINT_SHEET_MAX_LABELS etiquetas (en hojas completas) por
+    # respuesta; el resto, en las partes siguientes (?part=)
+    columns, rows = _sheet_layout(store, paper)
+    per_sheet = columns * rows
+    per_part = max(current_app.config['PRINT_SHEET_MAX_LABELS'] // per_sheet, 1) * per_sheet
+    parts = (total_labels + per_part - 1) // per_part
+    part = min(max(request.values.get('part', 1, type=int), 1), parts)
+    products = (query.order_by(Product.name, Product.id)
+                .offset((part - 1) * per_part).limit(per_part).all())
+    
+    # QR incrustados como data URI: una sola respuesta para toda la hoja
+    qr_format = qr_print_format()
+    labels = [(product, qr_data_uri(product, qr_format)) for product in products]
+    sheets = [labels[i:i + per_sheet] for i in range(0, len(labels), per_sheet)]
+    
+    paper_width, paper_height = PAPER_SIZES_MM[paper]
+    return render_template('admin/print_sheet.html',
+                         sheets=sheets,
+                         store=store,
+                         qr_size_mm=_label_qr_size_mm(store),
+                         paper=paper,
+                         qr_format=qr_format,
+                         product_ids=product_ids,
+                         category_id=category_id,
+                         scope=scope,
+                         paper_width=paper_width,
+                         paper_height=paper_height,
+                         columns=columns,
+                         rows=rows,
+                         total_labels=total_labels,
+                         part=part,
+                         parts=parts,
+                         first_label=(part - 1) * per_part + 1,
+                         last_label=(part - 1) * per_part + len(labels),
+                         sheet_margin_mm=SHEET_MARGIN_MM,
+                         label_gap_mm=LABEL_GAP_MM)
+
+def _label_qr_size_mm(store):
+    """Calcular tamaño exacto del QR en mm basado en el porcentaje y las dimensiones"""
     label_width = store.label_width or 80
-    label_height = store.label_height or 50
     qr_percent = store.label_qr_size or 30
     
     # Para rectangular: QR es un porcentaje del ancho disponible
     # Para cuadrada/circular: QR es un porcentaje del ancho total
-    if store.label_template == 'rectangular':
-        # En rectangular el QR comparte espacio horizontal, usar % más conservador
-        qr_size_mm = (label_width * qr_percent) / 100
+    return (label_width * qr_percent) / 100
+
+def _label_size_mm(store):
+    """Dimensiones (ancho, alto) de una etiqueta según la plantilla"""
+    if store.label_template in ('square', 'circular'):
+        size = store.label_width or 60
+        return size, size
+    return store.label_width or 80, store.label_height or 50
+
+def _sheet_layout(store, paper):
+    """Columnas y filas de etiquetas que caben en una hoja"""
+    paper_width, paper_height = PAPER_SIZES_MM[paper]
+    label_width, label_height = _label_size_mm(store)
+    usable_width = paper_width - 2 * SHEET_MARGIN_MM
+    usable_height = paper_height - 2 * SHEET_MARGIN_MM
+    columns = int((usable_width + LABEL_GAP_MM) // (label_width + LABEL_GAP_MM))
+    rows = int((usable_height + LABEL_GAP_MM) // (label_height + LABEL_GAP_MM))
+    return max(columns, 1), max(rows, 1)
+
+def qr_data_uri(product, fmt='png'):
+    """QR del producto como data URI (leído del cache en disco)"""
+    render, mimetype = QR_FORMATS[fmt]
+    filename = save_qr_image(product.id, product.sku, fmt)
+    if filename:
+        with open(os.path.join(current_app.config['QR_FOLDER'], filename), 'rb') as f:
+            data = f.read()
     else:
-        # En square/circular el QR tiene todo el ancho disponible
-        qr_size_mm = (label_width * qr_percent) / 100
+        data = render(_product_qr_payload(product.sku), _qr_options())
     
-    return render_template('admin/print_ticket.html', 
-                         product=product, 
-                         qr_url=qr_url,
-                         store=store,
-                         qr_size_mm=qr_size_mm)
+    if fmt == 'svg':
+        # El SVG es texto: URL-encoding ocupa menos que base64
+        return f'data:{mimetype};charset=utf-8,' + quote(data.decode('utf-8'))
+    return f'data:{mimetype};base64,' + base64.b64encode(data).decode('ascii')
 
-def save_qr_image(product_id, product_sku):
-    """Guardar imagen QR en disco (opcional para cache)"""
+def save_qr_image(product_id, product_sku, fmt='png'):
+    """Guardar imagen QR en disco (cache direccionado por contenido)"""
     try:
-        product_url = url_for('public.product_view', sku=product_sku, _external=True)
+        render, _ = QR_FORMATS[fmt]
+        options = _qr_options()
+        payload = _product_qr_payload(product_sku)
+        key = qr_cache_key(payload, options, fmt)
         
-        # Crear directorio QR si no existe
         qr_dir = current_app.config['QR_FOLDER']
-        os.makedirs(qr_dir, exist_ok=True)
-        
-        # Generar QR
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(product_url)
-        qr.make(fit=True)
-        
-        img = qr.make_image(fill_color="black", back_color="white")
-        
-        # Guardar archivo
-        filename = f"qr_{product_sku}_{product_id}.png"
+        filename = f"qr_{product_id}_{key}.{fmt}"
         file_path = os.path.join(qr_dir, filename)
-        img.save(file_path)
+        
+        if not os.path.exists(file_path):
+            os.makedirs(qr_dir, exist_ok=True)
+            
+            # Escritura atómica: otros workers nunca leen un archivo a medias
+            tmp_path = f"{file_path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(render(payload, options))
+            os.replace(tmp_path, file_path)
         
         return filename
     except Exception as e:
         print(f"Error guardando QR: {e}")
-        return None
\ No newline at end of file
+        return None
+
+def invalidate_qr_cache(product_id):
+    """Eliminar del cache las imágenes QR de un producto (p. ej. al cambiar el SKU)"""
+    pattern = os.path.join(current_app.config['QR_FOLDER'], f"qr_{product_id}_*")
+    for file_path in glob.glob(pattern):
+        try:
+            os.remove(file_path)
+        except OSError:
+            pass
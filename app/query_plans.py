@@ -0,0 +1,104 @@
+"""
+Planes de ejecución de las consultas frecuentes (ver `flask db-explain`).
+
+Cada entrada reproduce una consulta de admin.py, public.py o admin_app.py con
+valores de ejemplo. En SQLite se usa EXPLAIN QUERY PLAN y un paso "SCAN tabla"
+sin índice es un recorrido completo; en PostgreSQL se desactiva el Seq Scan
+para que el planificador use un índice si existe, aunque la tabla sea pequeña.
+
+Los totales globales del panel de superadministración (COUNT de tablas
+completas) no están aquí: recorren la tabla entera por definición.
+"""
+from datetime import datetime, timedelta
+from app.models import db, Product, ProductImage, Category, Store, User, PriceHistory, ProductViewDaily, normalize_sku
+from app.catalog_export import export_query
+
+def hot_queries(user_id=1, product_id=1, category_id=1, sku='PRD-000001'):
+    """Lista de (nombre, consulta) con las consultas que se ejecutan en cada petición"""
+    since = datetime.utcnow() - timedelta(days=30)
+    cursor = (Product.created_at, Product.id)
+    seek = db.tuple_(*cursor) < db.tuple_(db.literal(since, Product.created_at.type), db.literal(product_id))
+
+    return [
+        ('admin.dashboard: categorías del usuario',
+         db.select(Category).where(Category.user_id == user_id, Category.active.is_(True))
+         .order_by(Category.name)),
+        ('admin.dashboard: productos por categoría',
+         db.select(Product.category_id, db.func.count(Product.id))
+         .where(Product.created_by == user_id).group_by(Product.category_id)),
+        ('admin.dashboard: todos los productos',
+         db.select(Product).where(Product.created_by == user_id).order_by(Product.created_at.desc())),
+        ('admin.dashboard: página de una categoría',
+         db.select(Product).where(Product.created_by == user_id, Product.category_id == category_id, seek)
+         .order_by(Product.created_at.desc(), Product.id.desc()).limit(21)),
+        ('admin.dashboard: imágenes de los productos',
+         db.select(ProductImage).where(ProductImage.product_id.in_([product_id, product_id + 1]))
+         .order_by(ProductImage.order)),
+        ('admin.dashboard: visitas de los productos',
+         db.select(ProductViewDaily.product_id, db.func.sum(ProductViewDaily.count))
+         .where(ProductViewDaily.product_id.in_([product_id, product_id + 1]))
+         .group_by(ProductViewDaily.product_id)),
+        ('admin.dashboard: más visitados',
+         db.select(Product.id, db.func.sum(ProductViewDaily.count))
+         .join(ProductViewDaily, Product.id == ProductViewDaily.product_id)
+         .where(ProductViewDaily.day >= since.date(), Product.created_by == user_id)
+         .group_by(Product.id)),
+        ('admin.product_detail: producto del usuario',
+         db.select(Product).where(Product.id == product_id, Product.created_by == user_id)),
+        ('admin.check_product_by_sku',
+         db.select(Product).where(Product.created_by == user_id,
+                                  Product.sku_normalized == normalize_sku(sku))),
+        ('admin.price_chart_data',
+         db.select(PriceHistory).where(PriceHistory.product_id == product_id)
+         .order_by(PriceHistory.changed_at)),
+        ('admin.product_views_data',
+         db.select(ProductViewDaily.day, ProductViewDaily.count)
+         .where(ProductViewDaily.product_id == product_id, ProductViewDaily.day >= since.date())
+         .order_by(ProductViewDaily.day)),
+        ('admin.catalog_export', export_query(user_id)),
+        ('categories.category_delete: productos de la categoría',
+         db.select(db.func.count()).select_from(Product).where(Product.category_id == category_id)),
+        ('public.page_version',
+         db.select(Product.id, Product.updated_at, Store.updated_at, ProductImage.id, ProductImage.status)
+         .outerjoin(Store, Store.user_id == Product.created_by)
+         .outerjoin(ProductImage, ProductImage.product_id == Product.id)
+         .where(Product.sku == sku, Product.active.is_(True))
+         .order_by(ProductImage.order, ProductImage.id)),
+        ('admin_app.user_list: página',
+         db.select(User).where(db.tuple_(User.created_at, User.id) < db.tuple_(
+             db.literal(since, User.created_at.type), db.literal(user_id)))
+         .order_by(User.created_at.desc(), User.id.desc()).limit(21)),
+        ('admin_app.product_list: página',
+         db.select(Product).where(seek).order_by(Product.created_at.desc(), Product.id.desc()).limit(21)),
+        ('admin_app.user_detail: productos del usuario',
+         db.select(Product).where(Product.created_by == user_id)
+         .order_by(Product.created_at.desc()).limit(10)),
+        ('admin_app.user_detail: categorías del usuario',
+         db.select(db.func.count()).select_from(Category).where(Category.user_id == user_id)),
+        ('admin_app.dashboard: últimos productos',
+         db.select(Product).order_by(Product.created_at.desc()).limit(10)),
+    ]
+
+def explain(conn, statement):
+    """Líneas del plan de ejecución de una consulta"""
+    sql = str(statement.compile(dialect=conn.dialect, compile_kwargs={'literal_binds': True}))
+    if conn.dialect.name == 'sqlite':
+        return [row[-1] for row in conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {sql}')]
+    return [row[0] for row in conn.exec_driver_sql(f'EXPLAIN {sql}')]
+
+def full_scans(conn, plan):
+    """Pasos del plan que recorren una tabla completa sin índice"""
+    if conn.dialect.name == 'sqlite':
+        return [step for step in plan if step.startswith('SCAN ') and ' USING ' not in step]
+    return [step.strip() for step in plan if 'Seq Scan' in step]
+
+def check_plans(conn):
+    """Devuelve [(nombre, plan, recorridos completos)] de todas las consultas frecuentes"""
+    if conn.dialect.name == 'postgresql':
+        conn.exec_driver_sql('SET LOCAL enable_seqscan = off')
+
+    results = []
+    for name, statement in hot_queries():
+        plan = explain(conn, statement)
+        results.append((name, plan, full_scans(conn, plan)))
+    return results
@@ -0,0 +1,177 @@
+"""
+Cambio masivo de precios (por categoría, selección o CSV).
+
+Editar producto por producto supone un formulario y un commit por cada uno.
+Aquí el plan se calcula sobre tuplas (id, sku, nombre, precio) sin cargar
+objetos ORM, se muestra como vista previa y, al aplicarlo, los UPDATE de
+product y los INSERT de price_history van en una sola transacción con
+executemany. Las cachés derivadas (páginas públicas y typeahead) se invalidan
+una vez al final.
+"""
+import io
+from datetime import datetime
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from app.models import db, Product, PriceHistory, normalize_sku
+from app.page_cache import invalidate_product_pages
+from app.search import typeahead_index
+from app.utils import read_csv_rows
+
+OPERATIONS = {
+    'percent': 'Porcentaje (%)',
+    'amount': 'Monto fijo (+/-)',
+    'set': 'Precio fijo',
+}
+
+CENT = Decimal('0.01')
+MIN_PRICE = CENT
+MAX_PRICE = Decimal('99999999.99')  # Numeric(10, 2)
+
+class PriceChange:
+    """Un producto cuyo precio cambia en el plan"""
+
+    __slots__ = ('product_id', 'sku', 'name', 'old_price', 'new_price')
+
+    def __init__(self, product_id, sku, name, old_price, new_price):
+        self.product_id = product_id
+        self.sku = sku
+        self.name = name
+        self.old_price = old_price
+        self.new_price = new_price
+
+    @property
+    def percent(self):
+        if not self.old_price:
+            return None
+        return float((self.new_price - self.old_price) / self.old_price * 100)
+
+class RepricePlan:
+    """Resultado de calcular un cambio masivo, antes de aplicarlo"""
+
+    def __init__(self):
+        self.changes = []
+        self.unchanged = 0
+        self.skipped = []  # (sku, motivo)
+
+    @property
+    def old_total(self):
+        return sum((change.old_price for change in self.changes), Decimal('0'))
+
+    @property
+    def new_total(self):
+        return sum((change.new_price for change in self.changes), Decimal('0'))
+
+def compute_price(old_price, operation, value, round_99=False):
+    """Nuevo precio redondeado al centavo (o a .99 si round_99)"""
+    if operation == 'percent':
+        price = old_price * (1 + value / 100)
+    elif operation == 'amount':
+        price = old_price + value
+    elif operation == 'set':
+        price = value
+    else:
+        raise ValueError(f'Operación desconocida: {operation}')
+
+    if round_99:
+        price = price.quantize(Decimal('1'), rounding=ROUND_HALF_UP) - CENT
+    return price.quantize(CENT, rounding=ROUND_HALF_UP)
+
+def parse_price_csv(text):
+    """Lee un CSV con columnas sku y price (o precio): ({sku normalizado: (sku, precio)}, errores)"""
+    rows = read_csv_rows(io.StringIO(text))
+    header = [column.strip().lower() for column in next(rows, [])]
+    try:
+        sku_column = header.index('sku')
+        price_column = header.index('price') if 'price' in header else header.index('precio')
+    except ValueError:
+        raise ValueError('El CSV debe tener una fila de encabezado con las columnas "sku" y "price" (o "precio")')
+
+    prices = {}
+    errors = []
+    for line, row in enumerate(rows, start=2):
+        if not any(cell.strip() for cell in row):
+            continue
+        try:
+            sku = row[sku_column].strip()
+            price = Decimal(row[price_column].strip().replace(',', '.')).quantize(CENT, rounding=ROUND_HALF_UP)
+        except (IndexError, InvalidOperation):
+            errors.append((f'línea {line}', 'fila incompleta o precio no válido'))
+            continue
+        if not sku:
+            errors.append((f'línea {line}', 'SKU vacío'))
+            continue
+        prices[normalize_sku(sku)] = (sku, price)
+    return prices, errors
+
+def _add(plan, row, new_price):
+    product_id, sku, name, old_price = row
+    old_price = Decimal(old_price).quantize(CENT)
+    if new_price < MIN_PRICE:
+        plan.skipped.append((sku, f'el precio resultante ({new_price}) es menor que {MIN_PRICE}'))
+    elif new_price > MAX_PRICE:
+        plan.skipped.append((sku, f'el precio resultante ({new_price}) es demasiado alto'))
+    elif new_price == old_price:
+        plan.unchanged += 1
+    else:
+        plan.changes.append(PriceChange(product_id, sku, name, old_price, new_price))
+
+def plan_rule(user_id, operation, value, round_99=False, category_id=None, product_ids=None):
+    """Plan para aplicar una regla a los productos del usuario
+
+    category_id=0 son los productos sin categoría; sin category_id ni
+    product_ids, todos los productos del usuario.
+    """
+    query = db.select(Product.id, Product.sku, Product.name, Product.price).where(Product.created_by == user_id)
+    if product_ids is not None:
+        query = query.where(Product.id.in_(product_ids))
+    elif category_id == 0:
+        query = query.where(Product.category_id.is_(None))
+    elif category_id is not None:
+        query = query.where(Product.category_id == category_id)
+
+    plan = RepricePlan()
+    for row in db.session.execute(query.order_by(Product.name, Product.id)):
+        _add(plan, row, compute_price(Decimal(row.price), operation, value, round_99))
+    return plan
+
+def plan_csv(user_id, prices, errors=()):
+    """Plan con los precios de un CSV ({sku normalizado: (sku, precio)}, ver parse_price_csv)"""
+    plan = RepricePlan()
+    plan.skipped.extend(errors)
+    found = set()
+    keys = list(prices)
+    # Por bloques para no pasar el límite de parámetros de SQLite
+    for i in range(0, len(keys), 500):
+        rows = db.session.execute(
+            db.select(Product.id, Product.sku, Product.name, Product.price, Product.sku_normalized)
+            .where(Product.created_by == user_id, Product.sku_normalized.in_(keys[i:i + 500]))
+            .order_by(Product.name, Product.id)
+        )
+        for product_id, sku, name, price, sku_normalized in rows:
+            found.add(sku_normalized)
+            _add(plan, (product_id, sku, name, price), prices[sku_normalized][1])
+    plan.skipped.extend((sku, 'no existe en tus productos') for key, (sku, _) in prices.items() if key not in found)
+    return plan
+
+def apply_plan(plan, user_id):
+    """Escribe el plan en una transacción y luego invalida las cachés; devuelve los cambios"""
+    if not plan.changes:
+        return 0
+    now = datetime.utcnow()
+    try:
+        # UPDATE ... WHERE id = ? con executemany (updated_at cambia también el ETag público)
+        db.session.execute(db.update(Product), [
+            {'id': change.product_id, 'price': change.new_price, 'updated_at': now}
+            for change in plan.changes
+        ])
+        db.session.execute(db.insert(PriceHistory), [
+            {'product_id': change.product_id, 'price': change.new_price, 'changed_at': now, 'changed_by': user_id}
+            for change in plan.changes
+        ])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    invalidate_product_pages(*(change.sku for change in plan.changes))
+    typeahead_index.invalidate(user_id)
+    return len(plan.changes)
@@ -0,0 +1,411 @@
+"""
+Índice de búsqueda de productos para el dashboard.
+
+Reemplaza el LIKE '%término%' (que recorre toda la tabla) por un índice de
+texto completo sobre nombre, SKU, descripción y nombre de categoría:
+
+- SQLite: tabla virtual FTS5 `product_search` (rowid = product.id),
+  ordenada por bm25.
+- PostgreSQL: tabla `product_search` con un tsvector ponderado e índice GIN,
+  ordenada por ts_rank.
+- Otros motores: se mantiene el LIKE anterior.
+
+El texto se indexa sin tildes y en minúsculas, así que 'cafe' encuentra
+'Café'. Cada palabra buscada funciona como prefijo ('cam' -> 'camiseta').
+El índice se actualiza en el mismo flush que crea, edita o elimina productos
+(y cuando se renombra una categoría).
+
+Para la búsqueda incremental (typeahead) hay además un índice de prefijos en
+memoria por usuario (TypeaheadIndex): una lista ordenada de palabras de
+nombre y SKU recorrida con bisect, sin consultar la base de datos.
+"""
+import heapq
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from sqlalchemy import event, text, table, column
+from app.models import db, Product, ProductImage, Category
+
+def normalize_search_text(value):
+    """Minúsculas y sin tildes (á -> a, ñ -> n)"""
+    value = value or ''
+    if value.isascii():
+        return value.lower()
+    value = unicodedata.normalize('NFKD', value)
+    return ''.join(ch for ch in value if not unicodedata.combining(ch)).lower()
+
+def search_terms(value):
+    """Palabras de la búsqueda, normalizadas"""
+    return re.findall(r'\w+', normalize_search_text(value))
+
+# Tabla del índice (no forma parte de db.metadata: se crea a mano según el motor)
+product_search = table('product_search', column('rowid'), column('product_id'))
+
+# Campos del producto que alimentan el índice
+INDEXED_PRODUCT_FIELDS = ('name', 'sku', 'description', 'category_id', 'created_by')
+
+class ProductSearchIndex:
+    """Índice de texto completo de productos, sincronizado con la sesión"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.dialect = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['search_index'] = self
+        if not event.contains(db.session, 'after_flush', self._after_flush):
+            event.listen(db.session, 'after_flush', self._after_flush)
+
+    @property
+    def enabled(self):
+        return self.dialect in ('sqlite', 'postgresql')
+
+    def create_table(self):
+        """Crea el índice si no existe (y lo llena la primera vez)"""
+        self.dialect = db.engine.dialect.name
+        if not self.enabled:
+            return
+
+        with db.engine.begin() as conn:
+            exists = db.inspect(conn).has_table('product_search')
+            if not exists:
+                if self.dialect == 'sqlite':
+                    conn.execute(text(
+                        "CREATE VIRTUAL TABLE product_search USING fts5("
+                        "name, sku, description, category, created_by UNINDEXED, "
+                        "tokenize = 'unicode61 remove_diacritics 2')"
+                    ))
+                else:
+                    conn.execute(text(
+                        "CREATE TABLE product_search ("
+                        "product_id INTEGER PRIMARY KEY REFERENCES product(id) ON DELETE CASCADE, "
+                        "created_by INTEGER NOT NULL, "
+                        "document TSVECTOR NOT NULL)"
+                    ))
+                    conn.execute(text(
+                        "CREATE INDEX ix_product_search_document ON product_search USING GIN (document)"
+                    ))
+                self.rebuild(conn)
+
+    def rebuild(self, conn):
+        """Reindexa todos los productos; devuelve cuántos"""
+        product_ids = [product_id for (product_id,) in conn.execute(db.select(Product.id))]
+        self.reindex(conn, product_ids)
+        return len(product_ids)
+
+    def reindex(self, conn, product_ids):
+        """Actualiza (o elimina) las entradas de los productos indicados"""
+        if not self.enabled or not product_ids:
+            return
+        product_ids = list(product_ids)
+
+        for start in range(0, len(product_ids), 500):
+            chunk = product_ids[start:start + 500]
+            rows = conn.execute(
+                db.select(Product.id, Product.created_by, Product.name, Product.sku,
+                          Product.description, Category.name)
+                .outerjoin(Category, Category.id == Product.category_id)
+                .where(Product.id.in_(chunk))
+            ).all()
+            entries = [{
+                'product_id': product_id,
+                'created_by': created_by,
+                'name': normalize_search_text(name),
+                'sku': normalize_search_text(sku),
+                'description': normalize_search_text(description),
+                'category': normalize_search_text(category_name),
+            } for product_id, created_by, name, sku, description, category_name in rows]
+
+            if self.dialect == 'sqlite':
+                conn.execute(db.delete(product_search).where(product_search.c.rowid.in_(chunk)))
+                if entries:
+                    conn.execute(text(
+                        "INSERT INTO product_search (rowid, name, sku, description, category, created_by) "
+                        "VALUES (:product_id, :name, :sku, :description, :category, :created_by)"
+                    ), entries)
+            else:
+                conn.execute(db.delete(product_search).where(product_search.c.product_id.in_(chunk)))
+                if entries:
+                    conn.execute(text(
+                        "INSERT INTO product_search (product_id, created_by, document) VALUES ("
+                        ":product_id, :created_by, "
+                        "setweight(to_tsvector('simple', :name), 'A') || "
+                        "setweight(to_tsvector('simple', :sku), 'A') || "
+                        "setweight(to_tsvector('simple', :category), 'B') || "
+                        "setweight(to_tsvector('simple', :description), 'C'))"
+                    ), entries)
+
+    def filter(self, query, search):
+        """Aplica la búsqueda a una consulta de Product, ordenada por relevancia"""
+        terms = search_terms(search)
+        if not terms:
+            return query.filter(db.false())
+
+        if self.dialect == 'sqlite':
+            fts_query = ' '.join(f'"{term}"*' for term in terms)
+            return query.join(
+                product_search, product_search.c.rowid == Product.id
+            ).filter(
+                text('product_search MATCH :fts_query').bindparams(fts_query=fts_query)
+            ).order_by(
+                # Pesos bm25 por columna: name, sku, description, category, created_by
+                text('bm25(product_search, 10.0, 10.0, 1.0, 4.0, 0.0)')
+            )
+
+        if self.dialect == 'postgresql':
+            ts_query = ' & '.join(f'{term}:*' for term in terms)
+            return query.join(
+                product_search, product_search.c.product_id == Product.id
+            ).filter(
+                text("product_search.document @@ to_tsquery('simple', :ts_query)").bindparams(ts_query=ts_query)
+            ).order_by(
+                text("ts_rank(product_search.document, to_tsquery('simple', :ts_query)) DESC").bindparams(ts_query=ts_query)
+            )
+
+        return query.filter(Product.name.contains(search) | Product.sku.contains(search))
+
+    def _after_flush(self, session, flush_context):
+        if not self.enabled:
+            return
+
+        product_ids = set()
+        for obj in session.new:
+            if isinstance(obj, Product):
+                product_ids.add(obj.id)
+        for obj in session.dirty:
+            if isinstance(obj, Product) and any(
+                db.inspect(obj).attrs[field].history.has_changes() for field in INDEXED_PRODUCT_FIELDS
+            ):
+                product_ids.add(obj.id)
+        for obj in session.deleted:
+            if isinstance(obj, Product):
+                product_ids.add(obj.id)
+
+        # Renombrar una categoría cambia el texto de todos sus productos
+        category_ids = [
+            obj.id for obj in session.dirty
+            if isinstance(obj, Category) and db.inspect(obj).attrs.name.history.has_changes()
+        ]
+        conn = session.connection()
+        if category_ids:
+            product_ids.update(conn.execute(
+                db.select(Product.id).where(Product.category_id.in_(category_ids))
+            ).scalars())
+
+        # Los productos eliminados ya no aparecen en la consulta: solo se borran
+        self.reindex(conn, product_ids)
+
+search_index = ProductSearchIndex()
+
+class TypeaheadIndex:
+    """Índice de prefijos en memoria, por usuario, para /admin/api/search
+    
+    Se construye la primera vez que un usuario busca y se actualiza al
+    confirmar cambios de productos en este proceso. Otros workers de
+    Passenger no ven esos cambios hasta que su copia caduca (TYPEAHEAD_TTL).
+    
+    Las listas de un usuario no se modifican una vez publicadas: cada cambio
+    publica copias nuevas bajo el lock, así que una búsqueda lee sin lock
+    una versión coherente aunque otro hilo borre productos a la vez.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._tenants = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['typeahead_index'] = self
+        if not event.contains(db.session, 'after_flush', self._after_flush):
+            event.listen(db.session, 'after_flush', self._after_flush)
+            event.listen(db.session, 'after_commit', self._after_commit)
+            event.listen(db.session, 'after_rollback', self._after_rollback)
+
+    def search(self, user_id, query, limit=10):
+        """Productos del usuario cuyas palabras empiezan por las de la búsqueda
+        
+        Orden: SKU exacto, nombre que empieza por la búsqueda, resto; a igual
+        nivel, por nombre.
+        """
+        terms = search_terms(query)
+        if not terms:
+            return []
+        tenant = self._tenant(user_id)
+        keys = tenant['keys']
+        products = tenant['products']
+
+        # Rango de la lista ordenada para cada palabra; se parte del más corto
+        ranges = sorted(
+            ((bisect_left(keys, (term + '\uffff',)), bisect_left(keys, (term,)), term) for term in terms),
+            key=lambda r: r[0] - r[1]
+        )
+        end, start, term = ranges[0]
+        candidates = {product_id for _, product_id in keys[start:end]}
+
+        # El resto de palabras: intersección con su rango, o filtro directo
+        # sobre las palabras de cada producto si ya quedan pocos candidatos
+        for end, start, term in ranges[1:]:
+            if not candidates:
+                break
+            if len(candidates) < 100:
+                candidates = {
+                    product_id for product_id in candidates
+                    if any(word.startswith(term) for word in products[product_id]['words'])
+                }
+            else:
+                candidates &= {product_id for _, product_id in keys[start:end]}
+
+        phrase = ' '.join(terms)
+        sku_phrase = ''.join(terms)
+        def rank(product_id):
+            entry = products[product_id]
+            if entry['sku_key'] == sku_phrase:
+                level = 0
+            elif entry['name_key'].startswith(phrase):
+                level = 1
+            else:
+                level = 2
+            return (level, entry['name_key'], product_id)
+
+        return [products[product_id] for product_id in heapq.nsmallest(limit, candidates, key=rank)]
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._tenants.clear()
+            else:
+                self._tenants.pop(user_id, None)
+
+    def _tenant(self, user_id):
+        with self._lock:
+            tenant = self._tenants.get(user_id)
+        if tenant is None or tenant['built_at'] + self.app.config['TYPEAHEAD_TTL'] < time.monotonic():
+            tenant = self._build(user_id)
+            with self._lock:
+                self._tenants[user_id] = tenant
+        return tenant
+
+    def _build(self, user_id):
+        """Carga los productos del usuario (dos consultas) y ordena sus palabras"""
+        rows = db.session.execute(
+            db.select(Product.id, Product.name, Product.sku, Product.price)
+            .where(Product.created_by == user_id)
+        ).all()
+        images = db.session.execute(
+            db.select(ProductImage.product_id, ProductImage.filename, ProductImage.status, ProductImage.version)
+            .join(Product, Product.id == ProductImage.product_id)
+            .where(Product.created_by == user_id)
+            .order_by(ProductImage.product_id, ProductImage.order.desc(), ProductImage.id.desc())
+        ).all()
+        # La última por producto es la de menor `order` (la imagen principal)
+        main_images = {product_id: (filename, status, version) for product_id, filename, status, version in images}
+
+        products = {}
+        keys = []
+        for product_id, name, sku, price in rows:
+            entry = self._entry(product_id, name, sku, price, main_images.get(product_id))
+            products[product_id] = entry
+            keys.extend((word, product_id) for word in entry['words'])
+        keys.sort()
+        return {'keys': keys, 'products': products, 'built_at': time.monotonic()}
+
+    @staticmethod
+    def _entry(product_id, name, sku, price, main_image):
+        name_terms = search_terms(name)
+        sku_terms = search_terms(sku)
+        sku_key = ''.join(sku_terms)
+        return {
+            'id': product_id,
+            'name': name,
+            'sku': sku,
+            'price': price,
+            'image': main_image,
+            'words': {*name_terms, *sku_terms, sku_key},
+            'name_key': ' '.join(name_terms),
+            'sku_key': sku_key,
+        }
+
+    def _apply(self, user_id, product_id, entry):
+        """Sustituye (o elimina, si entry es None) un producto en el índice"""
+        with self._lock:
+            tenant = self._tenants.get(user_id)
+            if tenant is None:
+                return
+            # Copias: las búsquedas en curso siguen con las listas anteriores
+            keys = list(tenant['keys'])
+            products = dict(tenant['products'])
+            old = products.pop(product_id, None)
+            if old is not None:
+                if entry is not None and entry['image'] is None:
+                    entry['image'] = old['image']
+                for word in old['words']:
+                    position = bisect_left(keys, (word, product_id))
+                    if position < len(keys) and keys[position] == (word, product_id):
+                        del keys[position]
+            if entry is not None:
+                products[product_id] = entry
+                for word in entry['words']:
+                    keys.insert(bisect_left(keys, (word, product_id)), (word, product_id))
+            self._tenants[user_id] = {'keys': keys, 'products': products, 'built_at': tenant['built_at']}
+
+    def _refresh_images(self, product_ids):
+        """Vuelve a leer la imagen principal de productos ya indexados"""
+        with self._lock:
+            indexed = {
+                product_id: tenant['products'][product_id]
+                for tenant in self._tenants.values()
+                for product_id in product_ids
+                if product_id in tenant['products']
+            }
+        if not indexed:
+            return
+        with db.engine.connect() as conn:
+            images = conn.execute(
+                db.select(ProductImage.product_id, ProductImage.filename, ProductImage.status, ProductImage.version)
+                .where(ProductImage.product_id.in_(list(indexed)))
+                .order_by(ProductImage.product_id, ProductImage.order.desc(), ProductImage.id.desc())
+            ).all()
+        main_images = {product_id: (filename, status, version) for product_id, filename, status, version in images}
+        for product_id, entry in indexed.items():
+            entry['image'] = main_images.get(product_id)
+
+    def _after_flush(self, session, flush_context):
+        # Se aplican al confirmar, para no reflejar cambios que luego se deshacen
+        changes = session.info.setdefault('typeahead_changes', {})
+        image_changes = session.info.setdefault('typeahead_image_changes', set())
+        for obj in list(session.new) + list(session.dirty):
+            if isinstance(obj, Product):
+                changes[obj.id] = (obj.created_by, self._entry(obj.id, obj.name, obj.sku, obj.price, None))
+        for obj in list(session.new) + list(session.deleted):
+            if isinstance(obj, ProductImage):
+                image_changes.add(obj.product_id)
+        for obj in session.deleted:
+            if isinstance(obj, Product):
+                changes[obj.id] = (obj.created_by, None)
+
+    def _after_commit(self, session):
+        changes = session.info.pop('typeahead_changes', {})
+        image_changes = session.info.pop('typeahead_image_changes', set())
+        if not self._tenants:
+            return
+        for product_id, (user_id, entry) in changes.items():
+            self._apply(user_id, product_id, entry)
+        if image_changes:
+            try:
+                self._refresh_images(image_changes)
+            except Exception as e:
+                self.app.logger.error(f"[typeahead] no se pudieron actualizar imágenes: {e}")
+
+    def _after_rollback(self, session):
+        session.info.pop('typeahead_changes', None)
+        session.info.pop('typeahead_image_changes', None)
+
+typeahead_index = TypeaheadIndex()
@@ -0,0 +1,44 @@
+"""
+Perfil de SQLite para producción.
+
+En modo rollback-journal (el predeterminado) cada escritura bloquea la base
+de datos entera y los lectores de otros workers de Passenger esperan o fallan
+con "database is locked". Con WAL los lectores no bloquean al escritor ni al
+revés. Los PRAGMA de SQLITE_PRAGMAS se aplican en cada conexión nueva del pool
+(journal_mode=WAL queda además guardado en el archivo de la base).
+
+El tamaño del pool (SQLALCHEMY_POOL_OPTIONS) se añade a las opciones del
+engine antes de crearlo, salvo con sqlite:// en memoria.
+"""
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from app.models import db
+
+def apply_pool_options(app):
+    """Añade SQLALCHEMY_POOL_OPTIONS a SQLALCHEMY_ENGINE_OPTIONS (antes de db.init_app)
+
+    Una base SQLite en memoria usa StaticPool, que no acepta pool_size ni
+    max_overflow; las opciones que ya estén en SQLALCHEMY_ENGINE_OPTIONS
+    tienen preferencia.
+    """
+    url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return
+    options = dict(app.config['SQLALCHEMY_POOL_OPTIONS'])
+    options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+def init_sqlite_profile(app):
+    """Registra los PRAGMA de SQLITE_PRAGMAS en el engine (solo SQLite)"""
+    pragmas = app.config['SQLITE_PRAGMAS']
+    with app.app_context():
+        engine = db.engine
+    if not pragmas or engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
@@ -1,6 +1,7 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app
 from flask_login import login_required, current_user
 from app.models import Store, db, Product
+from app.page_cache import invalidate_owner_pages
 from app.forms import StoreConfigForm, LabelTemplateForm
 from werkzeug.utils import secure_filename
 import os
@@ -70,6 +71,7 @@ def config():
             store.logo_filename = unique_filename
         
         db.session.commit()
+        invalidate_owner_pages(current_user.id)
         flash('Configuración actualizada exitosamente', 'success')
         return redirect(url_for('store.config'))
     
@@ -1,8 +1,13 @@
 import os
+import csv
+import itertools
 import uuid
+import mimetypes
+from urllib.parse import quote
 from werkzeug.utils import secure_filename
-from PIL import Image
-from flask import current_app
+from werkzeug.security import safe_join
+from PIL import Image, features
+from flask import current_app, send_from_directory, abort
 from app.models import ProductImage, db
 import random
 import string
@@ -17,44 +22,136 @@ def generate_sku(prefix='PRD'):
     random_suffix = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
     return f"{prefix}-{random_suffix}"
 
-def create_thumbnail(image_path, thumbnail_path, width=400):
-    """Crea un thumbnail de la imagen"""
-    try:
-        with Image.open(image_path) as img:
-            # Convertir a RGB si es necesario (para PNG con transparencia)
-            if img.mode in ('RGBA', 'LA', 'P'):
-                img = img.convert('RGB')
-            
-            # Calcular nueva altura manteniendo proporción
-            ratio = width / img.width
-            height = int(img.height * ratio)
-            
-            # Redimensionar
-            img_resized = img.resize((width, height), Image.Resampling.LANCZOS)
-            img_resized.save(thumbnail_path, 'JPEG', quality=85, optimize=True)
-        return True
-    except Exception as e:
-        print(f"Error creando thumbnail: {e}")
-        return False
+def read_csv_rows(lines):
+    """Lector CSV sobre un iterable de líneas; separador coma o punto y coma según el encabezado"""
+    lines = iter(lines)
+    first_line = next(lines, '').lstrip('\ufeff')
+    delimiter = ';' if first_line.count(';') > first_line.count(',') else ','
+    return csv.reader(itertools.chain([first_line], lines), delimiter=delimiter)
+
+def _resize_to_width(img, width):
+    """Redimensiona manteniendo proporción; reducing_gap hace primero un
+    Image.reduce() entero y deja el LANCZOS solo para el último tramo"""
+    height = max(1, int(img.height * width / img.width))
+    return img.resize((width, height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+# Formatos de la escalera responsive: (formato PIL, opciones de guardado)
+VARIANT_FORMATS = {
+    'jpg': ('JPEG', {'quality': 85, 'optimize': True}),
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'avif': ('AVIF', {'quality': 60, 'speed': 6}),
+}
+
+def _pillow_can_encode(fmt):
+    # features.check() avisa con "Unknown feature" en cada llamada si el Pillow
+    # instalado no conoce el formato (AVIF antes de 11.2): se pregunta por
+    # módulo y por códec, y se trata como no disponible
+    for check in (features.check_module, features.check_codec):
+        try:
+            return check(fmt)
+        except ValueError:
+            continue
+    return False
+
+# Se comprueba una vez al importar, no en cada imagen
+ENCODABLE_FORMATS = {fmt for fmt in VARIANT_FORMATS if _pillow_can_encode(fmt)}
+
+def supported_variant_formats(formats):
+    """Filtra los formatos modernos que el Pillow instalado sabe codificar"""
+    return [fmt for fmt in formats if fmt in ENCODABLE_FORMATS]
+
+def generate_image_derivatives(image_path, max_width=1024, derivatives=None, widths=(), formats=()):
+    """Genera todos los tamaños de una imagen con una sola decodificación
+    
+    - La original se reduce en el mismo archivo a max_width si es más ancha
+      (se compara con el ancho del archivo, no con el decodificado por draft).
+    - Cada derivado (p. ej. {'thumb': 400, 'icon': 150}) se guarda como
+      <nombre>_<sufijo>.jpg.
+    - Escalera responsive: para cada ancho de `widths` menor que la original,
+      y para el de la original, se guarda <nombre>_<ancho>w.jpg y, por cada
+      formato de `formats` ('webp', 'avif'), <nombre>_<ancho>w.<formato>. La
+      original (que puede ser PNG o WebP) no forma parte de la escalera.
+    - Cada tamaño se genera a partir del inmediatamente mayor; en JPEG,
+      Image.draft() decodifica directamente a 1/2, 1/4 u 1/8 de la resolución
+      (escalado DCT) sin bajar del tamaño más grande necesario.
+    
+    Se ejecuta en un proceso del pool (ver app/image_pipeline.py), por lo que
+    no usa current_app: recibe todos los parámetros explícitamente.
+    Devuelve el ancho final, los formatos de la escalera ('jpg' y los
+    modernos generados) y una versión nueva, para guardarlos en ProductImage.
+    """
+    derivatives = derivatives or {'thumb': 400}
+    formats = supported_variant_formats(formats)
+    name, ext = os.path.splitext(image_path)
+    
+    with Image.open(image_path) as img:
+        file_width = img.width
+        largest = min(max(max_width, *derivatives.values()), img.width)
+        if img.format == 'JPEG':
+            img.draft('RGB', (largest, int(img.height * largest / img.width)))
+        
+        # Convertir a RGB si es necesario (para PNG con transparencia)
+        if img.mode in ('RGBA', 'LA', 'P'):
+            img = img.convert('RGB')
+        
+        # Redimensionar la original si es muy grande. draft() puede haberla
+        # decodificado ya justo a max_width (p. ej. 4096 -> 1024 a 1/4): también
+        # hay que reescribirla
+        full = _resize_to_width(img, max_width) if img.width > max_width else img
+        rewrite_original = file_width > full.width
+        
+        # Archivos a generar por ancho: [(ruta, formato)]
+        outputs = {}
+        for suffix, width in derivatives.items():
+            outputs.setdefault(width, []).append((f"{name}_{suffix}.jpg", 'jpg'))
+        ladder = [width for width in widths if width < full.width] + [full.width]
+        for fmt in ['jpg'] + formats:
+            for width in ladder:
+                outputs.setdefault(width, []).append((f"{name}_{width}w.{fmt}", fmt))
+        
+        # De mayor a menor, cada tamaño desde el anterior
+        source = full
+        for width in sorted(outputs, reverse=True):
+            if source.width < width:
+                source = full
+            resized = source if source.width == width else _resize_to_width(source, width)
+            for path, fmt in outputs[width]:
+                pil_format, options = VARIANT_FORMATS[fmt]
+                resized.save(path, pil_format, **options)
+            source = resized
+        
+        if rewrite_original:
+            full.save(image_path, 'JPEG', quality=90, optimize=True)
+    
+    return {'width': full.width, 'formats': ','.join(['jpg'] + formats), 'version': uuid.uuid4().hex[:8]}
 
-def resize_image(image_path, max_width=1024):
-    """Redimensiona la imagen original si es muy grande"""
-    try:
-        with Image.open(image_path) as img:
-            if img.width > max_width:
-                # Convertir a RGB si es necesario
-                if img.mode in ('RGBA', 'LA', 'P'):
-                    img = img.convert('RGB')
-                
-                ratio = max_width / img.width
-                height = int(img.height * ratio)
-                
-                img_resized = img.resize((max_width, height), Image.Resampling.LANCZOS)
-                img_resized.save(image_path, 'JPEG', quality=90, optimize=True)
-        return True
-    except Exception as e:
-        print(f"Error redimensionando imagen: {e}")
-        return False
+def send_upload(filename, max_age=None):
+    """Sirve un archivo de UPLOAD_FOLDER según UPLOADS_SERVE_MODE
+    
+    - flask: el worker de Python lee y envía el archivo.
+    - x-sendfile: Flask responde solo con la cabecera X-Sendfile
+      (USE_X_SENDFILE) y Apache (mod_xsendfile) envía el archivo.
+    - x-accel: cabecera X-Accel-Redirect hacia la location interna
+      UPLOADS_ACCEL_PREFIX de nginx.
+    
+    En todos los modos Flask valida antes la ruta (dentro de UPLOAD_FOLDER
+    y existente); `flask uploads-server-config` genera la configuración.
+    """
+    if current_app.config['UPLOADS_SERVE_MODE'] != 'x-accel':
+        return send_from_directory(current_app.config['UPLOAD_FOLDER'], filename, max_age=max_age)
+    
+    path = safe_join(current_app.config['UPLOAD_FOLDER'], filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    
+    response = current_app.response_class()
+    response.headers['X-Accel-Redirect'] = current_app.config['UPLOADS_ACCEL_PREFIX'].rstrip('/') + '/' + quote(filename)
+    response.content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    # nginx conserva Cache-Control del backend y añade ETag/Last-Modified propios
+    if max_age:
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+    return response
 
 def save_product_images(product_id, files):
     """Guarda múltiples imágenes para un producto"""
@@ -77,28 +174,26 @@ def save_product_images(product_id, files):
             name, ext = os.path.splitext(original_filename)
             unique_filename = f"{uuid.uuid4().hex}{ext}"
             
-            # Guardar archivo
+            # Guardar archivo (el procesado se hace después, fuera de la petición)
             file_path = os.path.join(product_dir, unique_filename)
             file.save(file_path)
             
-            # Redimensionar imagen original si es necesaria
-            resize_image(file_path, current_app.config['MAX_IMAGE_WIDTH'])
-            
-            # Crear thumbnail
-            name_only = os.path.splitext(unique_filename)[0]
-            thumbnail_filename = f"{name_only}_thumb.jpg"
-            thumbnail_path = os.path.join(product_dir, thumbnail_filename)
-            create_thumbnail(file_path, thumbnail_path, current_app.config['THUMBNAIL_WIDTH'])
-            
             # Guardar en base de datos
             last_order += 1
             product_image = ProductImage(
                 product_id=product_id,
                 filename=unique_filename,
-                order=last_order
+                order=last_order,
+                status='processing'
             )
             db.session.add(product_image)
-            saved_images.append(product_image)
+            saved_images.append((product_image, file_path))
     
     db.session.commit()
-    return saved_images
\ No newline at end of file
+    
+    # Redimensionar y crear thumbnails en el pool de procesos
+    from app.image_pipeline import image_pipeline
+    for product_image, file_path in saved_images:
+        image_pipeline.submit(product_image.id, file_path)
+    
+    return [product_image for product_image, _ in saved_images]
\ No newline at end of file
@@ -0,0 +1,191 @@
+"""
+Registro asíncrono de visitas a productos.
+
+Las visitas de /p/<sku> se encolan en memoria y un hilo de fondo las escribe
+en lote (executemany) cada VIEW_BATCH_SIZE eventos o VIEW_FLUSH_INTERVAL
+segundos, de modo que la página pública nunca espera una escritura. Cada lote
+actualiza también el rollup diario (product_view_daily).
+"""
+import atexit
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from sqlalchemy.exc import IntegrityError
+from app.models import db, Product, ProductView, ProductViewDaily
+
+class ViewTracker:
+    """Cola acotada de visitas con escritor en lote en segundo plano"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._counters = {
+            'queued': 0,
+            'flushed': 0,
+            'dropped': 0,
+            'failed': 0,
+            'orphaned': 0,  # el producto se eliminó antes de escribir la visita
+            'batches': 0,
+        }
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self._queue = queue.Queue(maxsize=app.config['VIEW_QUEUE_MAXSIZE'])
+        app.extensions['view_tracker'] = self
+        atexit.register(self.shutdown)
+
+    def record(self, product_id, ip_address=None, user_agent=None):
+        """Encola una visita. Nunca espera a la base de datos."""
+        event = {
+            'product_id': product_id,
+            'viewed_at': datetime.utcnow(),
+            'ip_address': ip_address,
+            'user_agent': (user_agent or '')[:255],
+        }
+
+        if not self.app.config['VIEW_TRACKING_ASYNC']:
+            self._write([event])
+            return True
+
+        self._ensure_worker()
+        try:
+            if self.app.config['VIEW_QUEUE_POLICY'] == 'block':
+                # Backpressure: esperar un poco a que el escritor libere espacio
+                self._queue.put(event, timeout=self.app.config['VIEW_QUEUE_BLOCK_TIMEOUT'])
+            else:
+                self._queue.put_nowait(event)
+        except queue.Full:
+            self._count('dropped')
+            return False
+
+        self._count('queued')
+        return True
+
+    def flush(self):
+        """Escribe de inmediato todo lo pendiente en la cola"""
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(batch) >= self.app.config['VIEW_BATCH_SIZE']:
+                self._write(batch)
+                batch = []
+        if batch:
+            self._write(batch)
+
+    def shutdown(self):
+        """Detiene el escritor y vacía la cola (al cerrar el proceso)"""
+        if self.app is None:
+            return
+        self._stop.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout=self.app.config['VIEW_FLUSH_INTERVAL'] * 2)
+        self.flush()
+
+    def stats(self):
+        """Contadores del proceso actual"""
+        with self._lock:
+            stats = dict(self._counters)
+        stats['pending'] = self._queue.qsize() if self._queue is not None else 0
+        return stats
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def _ensure_worker(self):
+        # Passenger hace fork después de cargar la app: cada proceso
+        # necesita su propio hilo (y su propia cola)
+        pid = os.getpid()
+        if self._pid == pid and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == pid and self._thread is not None and self._thread.is_alive():
+                return
+            if self._pid != pid:
+                self._queue = queue.Queue(maxsize=self.app.config['VIEW_QUEUE_MAXSIZE'])
+                self._stop = threading.Event()
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name='view-tracker', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        batch_size = self.app.config['VIEW_BATCH_SIZE']
+        interval = self.app.config['VIEW_FLUSH_INTERVAL']
+        batch = []
+        deadline = time.monotonic() + interval
+
+        while not self._stop.is_set():
+            timeout = max(deadline - time.monotonic(), 0)
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                pass
+
+            if len(batch) >= batch_size or time.monotonic() >= deadline:
+                if batch:
+                    self._write(batch)
+                    batch = []
+                deadline = time.monotonic() + interval
+
+        if batch:
+            self._write(batch)
+
+    def _write(self, batch):
+        # Un segundo intento si un producto se elimina entre el filtro y el INSERT
+        for attempt in range(2):
+            try:
+                with self.app.app_context():
+                    with db.engine.begin() as conn:
+                        batch = self._existing(conn, batch)
+                        if not batch:
+                            return
+                        conn.execute(ProductView.__table__.insert(), batch)
+                        # Mantener el rollup diario en la misma transacción
+                        days = [event['viewed_at'].date() for event in batch]
+                        ProductViewDaily.refresh(
+                            conn,
+                            {event['product_id'] for event in batch},
+                            min(days),
+                            max(days)
+                        )
+            except IntegrityError as e:
+                if attempt == 0:
+                    continue
+                error = e
+            except Exception as e:
+                error = e
+            else:
+                self._count('flushed', len(batch))
+                self._count('batches')
+                return
+            self._count('failed', len(batch))
+            self.app.logger.error(f"[view_tracker] error escribiendo {len(batch)} visitas: {error}")
+            return
+
+    def _existing(self, conn, batch):
+        """Descarta las visitas de productos eliminados después de encolarlas
+
+        Un producto puede eliminarse mientras sus visitas esperan en la cola:
+        sin este filtro harían fallar el lote entero (clave foránea en
+        PostgreSQL) o dejarían filas huérfanas (SQLite).
+        """
+        product_ids = {event['product_id'] for event in batch}
+        existing = set(conn.execute(db.select(Product.id).where(Product.id.in_(product_ids))).scalars())
+        if len(existing) == len(product_ids):
+            return batch
+        kept = [event for event in batch if event['product_id'] in existing]
+        self._count('orphaned', len(batch) - len(kept))
+        return kept
+
+view_tracker = ViewTracker()
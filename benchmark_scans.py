@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark de escaneos concurrentes sobre SQLite, con y sin SQLITE_PRAGMAS.
+
+Varios procesos (como los workers de Passenger) abren /p/<sku> en bucle con el
+registro de visitas síncrono, de modo que cada escaneo hace la consulta del
+ETag y una escritura (el HTML sale de la caché de páginas, como en producción).
+Cada escenario usa una base de datos temporal nueva.
+Ejecutar con: python benchmark_scans.py [--workers 4] [--seconds 10] [--dir carpeta]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Agregar el directorio actual al path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+PRODUCTS = 200
+
+def load_app(database_url, pragmas):
+    """Crea la aplicación contra database_url con el perfil de SQLite indicado"""
+    from config import Config
+    Config.SQLALCHEMY_DATABASE_URI = database_url
+    Config.SQLITE_PRAGMAS = pragmas
+    Config.VIEW_TRACKING_ASYNC = False  # una escritura por escaneo, como el peor caso
+
+    import importlib.util
+    spec = importlib.util.spec_from_file_location("app_main", "app.py")
+    app_main = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(app_main)
+    return app_main.app
+
+def seed(app):
+    from app.models import db, User, Product
+    with app.app_context():
+        user = User(email='benchmark@example.com')
+        user.set_password('benchmark')
+        db.session.add(user)
+        db.session.commit()
+        db.session.add_all(
+            Product(sku=f'BENCH-{i:04d}', name=f'Producto {i}', slug=f'producto-{i}',
+                    price=10 + i % 50, created_by=user.id)
+            for i in range(PRODUCTS)
+        )
+        db.session.commit()
+
+def worker(database_url, pragmas, seconds, start, results):
+    app = load_app(database_url, pragmas)
+    from app.view_tracking import view_tracker
+    client = app.test_client()
+
+    while time.time() < start:
+        time.sleep(0.01)
+    scans = errors = 0
+    deadline = start + seconds
+    while time.time() < deadline:
+        response = client.get(f'/p/BENCH-{random.randrange(PRODUCTS):04d}',
+                              base_url='https://localhost')
+        if response.status_code == 200:
+            scans += 1
+        else:
+            errors += 1
+    # Las visitas que no se pudieron escribir (p. ej. "database is locked")
+    results.put((scans - view_tracker.stats()['failed'], errors + view_tracker.stats()['failed']))
+
+def run(name, pragmas, workers, seconds, directory=None):
+    with tempfile.TemporaryDirectory(dir=directory) as folder:
+        database_url = f'sqlite:///{os.path.join(folder, "benchmark.db")}'
+        seed(load_app(database_url, pragmas))
+
+        context = multiprocessing.get_context('spawn')
+        results = context.Queue()
+        start = time.time() + 5  # margen para que todos los procesos carguen la app
+        processes = [
+            context.Process(target=worker, args=(database_url, pragmas, seconds, start, results))
+            for _ in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        totals = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+    scans = sum(ok for ok, _ in totals)
+    errors = sum(failed for _, failed in totals)
+    print(f"{name:<22} {scans / seconds:>10.1f} escaneos/s   {errors} errores")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--seconds', type=int, default=10)
+    parser.add_argument('--dir', default=None,
+                        help='Carpeta para las bases temporales (mejor en el mismo disco que la de producción).')
+    args = parser.parse_args()
+
+    from config import Config
+    print(f"{args.workers} procesos, {args.seconds} s por escenario")
+    run('rollback journal', {}, args.workers, args.seconds, args.dir)
+    run('SQLITE_PRAGMAS (WAL)', dict(Config.SQLITE_PRAGMAS), args.workers, args.seconds, args.dir)
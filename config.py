@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -7,6 +8,24 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///shopqr.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Pool de conexiones (QueuePool): las conexiones, con sus PRAGMA y su caché de
+    # páginas, se reutilizan entre peticiones. No se aplica a sqlite:// en memoria,
+    # que usa StaticPool (una sola conexión)
+    SQLALCHEMY_POOL_OPTIONS = {
+        'pool_size': 5,
+        'max_overflow': 5,
+        'pool_timeout': 10,  # segundos esperando una conexión libre
+    }
+    
+    # Perfil de SQLite: PRAGMA en cada conexión nueva ({} lo desactiva; se ignora con otros motores)
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',  # lectores y escritor no se bloquean entre sí
+        'synchronous': 'NORMAL',  # con WAL es seguro: fsync solo en los checkpoints
+        'busy_timeout': 5000,  # ms esperando un bloqueo antes de "database is locked"
+        'cache_size': -16000,  # caché de páginas por conexión (negativo = KiB)
+        'mmap_size': 128 * 1024 * 1024,  # bytes leídos por mmap
+        'temp_store': 'MEMORY',  # tablas temporales de ORDER BY / GROUP BY en memoria
+    }
     
     # Session settings - Mantener login por 30 días
     PERMANENT_SESSION_LIFETIME = 60 * 60 * 24 * 30  # 30 días en segundos
@@ -21,13 +40,74 @@ class Config:
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'webp'}
+    # Subcarpetas con URLs que no cambian de contenido: nombres únicos (UUID / hash)
+    # y, en products/, la versión del procesado en ?v= (ProductImage.version)
+    UPLOADS_IMMUTABLE_PREFIXES = ('products/', 'store/', 'qr/')
+    UPLOADS_CACHE_MAX_AGE = 60 * 60 * 24 * 365  # 1 año
+    # Quién envía los archivos de /uploads: flask | x-sendfile (Apache) | x-accel (nginx)
+    UPLOADS_SERVE_MODE = os.environ.get('UPLOADS_SERVE_MODE') or 'flask'
+    UPLOADS_ACCEL_PREFIX = '/_uploads/'  # location interna de nginx (x-accel)
     
     # Image settings
     MAX_IMAGE_WIDTH = 1024
     THUMBNAIL_WIDTH = 400
+    ICON_WIDTH = 150  # miniaturas de listas
+    IMAGE_DERIVATIVES = {'thumb': THUMBNAIL_WIDTH, 'icon': ICON_WIDTH}  # sufijo: ancho
+    IMAGE_SRCSET_WIDTHS = (320, 480, 640, 800)  # escalera responsive (más la original)
+    IMAGE_SRCSET_FORMATS = ('avif', 'webp')  # solo los que soporte Pillow; JPEG siempre
+    IMAGE_WORKERS = 2  # procesos para redimensionar imágenes (0 = en la petición)
     
     # QR settings
     QR_FOLDER = os.path.join(UPLOAD_FOLDER, 'qr')
+    QR_ERROR_CORRECTION = 'L'  # L, M, Q, H
+    QR_BOX_SIZE = 10
+    QR_BORDER = 4
+    QR_FILL_COLOR = 'black'
+    QR_BACK_COLOR = 'white'
+    QR_CACHE_MAX_AGE = 60 * 60 * 24 * 365  # 1 año (URLs versionadas con el hash)
+    QR_PRINT_FORMAT = 'svg'  # svg | png (formato del QR en etiquetas)
+    PRINT_SHEET_MAX_LABELS = 200  # etiquetas por página de impresión (se redondea a hojas completas)
+    
+    # Registro de visitas (cola en memoria + escritura en lote)
+    VIEW_TRACKING_ASYNC = True  # False: escribir cada visita al momento
+    VIEW_QUEUE_MAXSIZE = 10000  # visitas pendientes como máximo por proceso
+    VIEW_BATCH_SIZE = 500
+    VIEW_FLUSH_INTERVAL = 2.0  # segundos
+    VIEW_QUEUE_POLICY = 'drop'  # drop: descartar si la cola está llena | block: esperar
+    VIEW_QUEUE_BLOCK_TIMEOUT = 0.05  # segundos de espera máxima con 'block'
+    
+    # Búsqueda incremental del dashboard (índice de prefijos en memoria)
+    TYPEAHEAD_LIMIT = 8  # resultados por defecto
+    TYPEAHEAD_TTL = 300  # segundos hasta reconstruir (cambios hechos en otros workers)
+    
+    # Escáner: SKUs máximos por consulta en /admin/api/check-products
+    SKU_LOOKUP_BATCH_MAX = 200
+    
+    # Gráfica de historial de precios: puntos por respuesta (por defecto y máximo de max_points)
+    PRICE_CHART_MAX_POINTS = 200
+    PRICE_CHART_MAX_POINTS_LIMIT = 1000
+    
+    # Cambio masivo de precios: filas de la vista previa
+    REPRICE_PREVIEW_ROWS = 200
+    
+    # Importación masiva de productos: filas por lote (una transacción cada uno)
+    IMPORT_BATCH_SIZE = 500
+    
+    # Exportación del catálogo: productos por bloque del cursor
+    EXPORT_BATCH_SIZE = 500
+    
+    # Paginación por cursor: segundos que se cachea el total aproximado de cada lista
+    PAGINATION_COUNT_TTL = 60
+    
+    # Caché de páginas públicas /p/<sku>
+    PAGE_CACHE_BACKEND = 'memory'  # memory (por proceso) | filesystem (compartido) | none
+    PAGE_CACHE_TTL = 300  # segundos
+    PAGE_CACHE_MAX_ENTRIES = 1000  # solo memory
+    PAGE_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'pages')
+    
+    # Exportación columnar para reportes (`flask analytics export`)
+    ANALYTICS_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'analytics')
+    ANALYTICS_EXPORT_CHUNK = 10000  # filas leídas por bloque
     
     @staticmethod
     def init_app(app):
@@ -39,8 +119,21 @@ class DevelopmentConfig(Config):
 class ProductionConfig(Config):
     DEBUG = False
 
+class TestingConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'  # en memoria (StaticPool)
+    WTF_CSRF_ENABLED = False
+    SESSION_COOKIE_SECURE = False
+    REMEMBER_COOKIE_SECURE = False
+    UPLOAD_FOLDER = os.path.join(tempfile.gettempdir(), 'tag2qr-tests', 'uploads')
+    QR_FOLDER = os.path.join(UPLOAD_FOLDER, 'qr')
+    IMAGE_WORKERS = 0
+    VIEW_TRACKING_ASYNC = False
+    PAGE_CACHE_BACKEND = 'none'
+
 config = {
     'development': DevelopmentConfig,
     'production': ProductionConfig,
+    'testing': TestingConfig,
     'default': DevelopmentConfig
 }
\ No newline at end of file
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Script para agregar a una base de datos existente las columnas nuevas de los modelos
+(db.create_all() crea tablas nuevas, pero no altera las existentes)
+Ejecutar con: python migrate_schema.py
+"""
+import os
+import sys
+
+# Agregar el directorio actual al path
+sys.path.insert(0, os.path.dirname(__file__))
+
+# Columnas agregadas después de la creación inicial: (tabla, columna, definición SQL)
+NEW_COLUMNS = [
+    ('product_image', 'status', "VARCHAR(20) DEFAULT 'ready' NOT NULL"),
+    ('product_image', 'width', "INTEGER"),
+    ('product_image', 'formats', "VARCHAR(50)"),
+    ('product_image', 'version', "VARCHAR(16)"),
+    ('product', 'updated_at', "DATETIME"),
+    ('product', 'sku_normalized', "VARCHAR(64)"),
+]
+
+# Índices sobre tablas existentes: (nombre, tabla, columnas)
+NEW_INDEXES = [
+    ('ix_product_created_by_sku_normalized', 'product', ('created_by', 'sku_normalized')),
+    ('ix_product_created_by_created_at_id', 'product', ('created_by', 'created_at', 'id')),
+    ('ix_product_created_at_id', 'product', ('created_at', 'id')),
+    ('ix_user_created_at_id', 'user', ('created_at', 'id')),
+    ('ix_product_created_by_category_id', 'product', ('created_by', 'category_id', 'created_at', 'id')),
+    ('ix_product_category_id', 'product', ('category_id',)),
+    ('ix_category_user_id_name', 'category', ('user_id', 'name')),
+    ('ix_product_image_product_id_order', 'product_image', ('product_id', 'order')),
+    ('ix_price_history_product_id_changed_at', 'price_history', ('product_id', 'changed_at')),
+    # Recuento del rollup diario por lote (ProductViewDaily.refresh)
+    ('ix_product_view_product_viewed_at', 'product_view', ('product_id', 'viewed_at')),
+]
+
+def backfill_sku_normalized(conn, batch_size=1000):
+    """Rellena product.sku_normalized en los productos que aún no lo tienen"""
+    from app.models import normalize_sku
+    from sqlalchemy import text
+    
+    total = 0
+    while True:
+        rows = conn.execute(text(
+            'SELECT id, sku FROM product WHERE sku_normalized IS NULL LIMIT :limit'
+        ), {'limit': batch_size}).all()
+        if not rows:
+            return total
+        conn.execute(
+            text('UPDATE product SET sku_normalized = :normalized WHERE id = :id'),
+            [{'id': id, 'normalized': normalize_sku(sku)} for id, sku in rows]
+        )
+        conn.commit()
+        total += len(rows)
+
+if __name__ == '__main__':
+    # Importar la función create_app
+    import importlib.util
+    spec = importlib.util.spec_from_file_location("app_main", "app.py")
+    app_main = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(app_main)
+    
+    from app.models import db
+    from sqlalchemy import inspect, text
+    
+    app = app_main.create_app()
+    
+    with app.app_context():
+        try:
+            print("Verificando estructura de la base de datos...")
+            
+            inspector = inspect(db.engine)
+            with db.engine.connect() as conn:
+                for table, column, definition in NEW_COLUMNS:
+                    columns = [c['name'] for c in inspector.get_columns(table)]
+                    
+                    if column not in columns:
+                        print(f"Agregando columna {table}.{column}...")
+                        conn.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {column} {definition}'))
+                        conn.commit()
+                        print(f"✓ Columna {table}.{column} agregada")
+                    else:
+                        print(f"✓ Columna {table}.{column} ya existe")
+                
+                updated = backfill_sku_normalized(conn)
+                print(f"✓ sku_normalized calculado para {updated} productos")
+                
+                for name, table, columns in NEW_INDEXES:
+                    if name not in [i['name'] for i in inspector.get_indexes(table)]:
+                        print(f"Creando índice {name}...")
+                        columns_sql = ', '.join(f'"{column}"' for column in columns)
+                        conn.execute(text(f'CREATE INDEX {name} ON "{table}" ({columns_sql})'))
+                        conn.commit()
+                        print(f"✓ Índice {name} creado")
+                    else:
+                        print(f"✓ Índice {name} ya existe")
+            
+            print("\n✓ Migración completada exitosamente")
+            
+        except Exception as e:
+            print(f"\n✗ Error durante la migración: {e}")
+            import traceback
+            traceback.print_exc()
+            sys.exit(1)
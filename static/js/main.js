@@ -397,4 +397,151 @@ function showMessage(message, type = 'info') {
     setTimeout(() => {
         messageEl.remove();
     }, 3000);
-}
\ No newline at end of file
+}
+
+// ==========================================
+// Búsqueda incremental (typeahead) del dashboard
+// ==========================================
+const TYPEAHEAD_MIN_CHARS = 2;
+const TYPEAHEAD_DELAY = 150;
+
+function setupTypeahead(input) {
+    const form = input.closest('form');
+    const list = document.createElement('ul');
+    list.className = 'typeahead-results';
+    list.hidden = true;
+    form.classList.add('typeahead');
+    form.appendChild(list);
+
+    let timer = null;
+    let controller = null;
+    let activeIndex = -1;
+
+    function close() {
+        list.hidden = true;
+        list.innerHTML = '';
+        activeIndex = -1;
+    }
+
+    function highlight(index) {
+        const items = list.querySelectorAll('.typeahead-item');
+        items.forEach((item, i) => item.classList.toggle('active', i === index));
+        activeIndex = index;
+    }
+
+    function render(results) {
+        list.innerHTML = '';
+        activeIndex = -1;
+        if (!results.length) {
+            close();
+            return;
+        }
+        results.forEach(product => {
+            const item = document.createElement('li');
+            const link = document.createElement('a');
+            link.className = 'typeahead-item';
+            link.href = product.url;
+
+            if (product.thumbnail_url) {
+                const img = document.createElement('img');
+                img.src = product.thumbnail_url;
+                img.alt = '';
+                img.loading = 'lazy';
+                link.appendChild(img);
+            } else {
+                const placeholder = document.createElement('span');
+                placeholder.className = 'typeahead-placeholder';
+                placeholder.innerHTML = '<i class="fas fa-image"></i>';
+                link.appendChild(placeholder);
+            }
+
+            const info = document.createElement('span');
+            info.className = 'typeahead-info';
+            const name = document.createElement('strong');
+            name.textContent = product.name;
+            const sku = document.createElement('small');
+            sku.textContent = product.sku;
+            info.append(name, sku);
+
+            const price = document.createElement('span');
+            price.className = 'typeahead-price';
+            price.textContent = product.price_formatted;
+
+            link.append(info, price);
+            item.appendChild(link);
+            list.appendChild(item);
+        });
+        list.hidden = false;
+    }
+
+    async function fetchResults(query) {
+        // Cancelar la petición anterior: solo importa la última tecla
+        if (controller) {
+            controller.abort();
+        }
+        controller = new AbortController();
+        const url = `${input.dataset.typeaheadUrl}?q=${encodeURIComponent(query)}`;
+        try {
+            const response = await fetch(url, {
+                signal: controller.signal,
+                headers: { 'Accept': 'application/json' }
+            });
+            if (!response.ok) {
+                close();
+                return;
+            }
+            const data = await response.json();
+            // Descartar respuestas de una consulta que ya no está en el campo
+            if (data.query === input.value.trim()) {
+                render(data.results);
+            }
+        } catch (error) {
+            if (error.name !== 'AbortError') {
+                close();
+            }
+        }
+    }
+
+    input.addEventListener('input', () => {
+        clearTimeout(timer);
+        const query = input.value.trim();
+        if (query.length < TYPEAHEAD_MIN_CHARS) {
+            if (controller) {
+                controller.abort();
+            }
+            close();
+            return;
+        }
+        timer = setTimeout(() => fetchResults(query), TYPEAHEAD_DELAY);
+    });
+
+    input.addEventListener('keydown', (e) => {
+        const items = list.querySelectorAll('.typeahead-item');
+        if (list.hidden || !items.length) {
+            return;
+        }
+        if (e.key === 'ArrowDown') {
+            e.preventDefault();
+            highlight((activeIndex + 1) % items.length);
+        } else if (e.key === 'ArrowUp') {
+            e.preventDefault();
+            highlight((activeIndex - 1 + items.length) % items.length);
+        } else if (e.key === 'Enter' && activeIndex >= 0) {
+            // Enter sin selección sigue enviando el formulario de búsqueda
+            e.preventDefault();
+            window.location.href = items[activeIndex].href;
+        } else if (e.key === 'Escape') {
+            close();
+        }
+    });
+
+    document.addEventListener('click', (e) => {
+        if (!form.contains(e.target)) {
+            close();
+        }
+    });
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('input[data-typeahead-url]').forEach(setupTypeahead);
+});
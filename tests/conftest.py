@@ -0,0 +1,70 @@
+"""
+Fixtures de pytest: la aplicación con TestingConfig (SQLite en memoria).
+
+app.py se carga desde su ruta, igual que en wsgi.py, porque el paquete app/
+tapa al módulo app.py.
+"""
+import importlib.util
+import itertools
+import os
+import sys
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ['FLASK_ENV'] = 'testing'
+
+_spec = importlib.util.spec_from_file_location('app_module', os.path.join(ROOT, 'app.py'))
+app_module = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(app_module)
+
+from app.models import db, User
+
+_emails = itertools.count(1)
+
+@pytest.fixture(scope='session')
+def app():
+    return app_module.app
+
+@pytest.fixture
+def app_context(app):
+    with app.app_context():
+        yield
+        db.session.remove()
+
+@pytest.fixture
+def client(app, app_context):
+    return app.test_client()
+
+@pytest.fixture
+def make_user(app_context):
+    """Crea usuarios con email único (la base se comparte entre tests)"""
+    def make(**kwargs):
+        user = User(email=f'user{next(_emails)}@example.com', **kwargs)
+        user.set_password('secret')
+        db.session.add(user)
+        db.session.commit()
+        return user
+    return make
+
+def login(client, user):
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+        session['_fresh'] = True
+
+@contextmanager
+def count_queries():
+    """Cuenta las sentencias SQL ejecutadas dentro del bloque"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
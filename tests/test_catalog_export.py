@@ -0,0 +1,22 @@
+"""
+Exportación del catálogo (/admin/export).
+"""
+import csv
+import io
+from decimal import Decimal
+
+from app.models import db, Product, ProductImage
+from conftest import login
+
+def test_image_url_carries_version(client, make_user):
+    user = make_user()
+    product = Product(sku=f'E{user.id}', name='Silla', slug='silla', price=Decimal('20.00'), created_by=user.id)
+    db.session.add(product)
+    db.session.flush()
+    db.session.add(ProductImage(product_id=product.id, filename='abc.jpg', order=1, status='ready', version='v7'))
+    db.session.commit()
+    login(client, user)
+
+    body = client.get('/admin/export', query_string={'format': 'csv'}).get_data(as_text=True)
+    row = next(csv.DictReader(io.StringIO(body.lstrip('\ufeff'))))
+    assert row['image_url'] == f'http://localhost/uploads/products/{product.id}/abc.jpg?v=v7'
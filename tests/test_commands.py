@@ -0,0 +1,32 @@
+"""
+Comandos CLI (flask <comando>).
+"""
+import os
+from decimal import Decimal
+
+from flask import current_app
+from PIL import Image
+
+from app.models import db, Product, ProductImage
+from test_public_page import memory_cache
+
+def test_process_pending_images_invalidates_product_page(app, client, make_user, memory_cache):
+    user = make_user()
+    product = Product(sku=f'C{user.id}', name='Jarra', slug='jarra', price=Decimal('8.00'), created_by=user.id)
+    db.session.add(product)
+    db.session.commit()
+    folder = os.path.join(current_app.config['UPLOAD_FOLDER'], 'products', str(product.id))
+    os.makedirs(folder, exist_ok=True)
+    Image.new('RGB', (600, 400), (10, 90, 160)).save(os.path.join(folder, 'jarra.jpg'), 'JPEG')
+    db.session.add(ProductImage(product_id=product.id, filename='jarra.jpg', status='processing'))
+    db.session.commit()
+
+    client.get(f'/p/{product.sku}')
+    assert memory_cache.get(product.sku) is not None
+
+    result = app.test_cli_runner().invoke(args=['process-pending-images'])
+
+    assert '✓' in result.output
+    assert memory_cache.get(product.sku) is None
+    db.session.expire_all()
+    assert db.session.scalar(db.select(ProductImage.status).where(ProductImage.product_id == product.id)) == 'ready'
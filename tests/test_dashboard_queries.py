@@ -0,0 +1,75 @@
+"""
+Número de consultas SQL por render del dashboard (regresión de N+1).
+
+El total no debe depender de cuántos productos, imágenes, categorías o
+visitas tenga el usuario.
+"""
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+from app.models import db, Category, Product, ProductImage, ProductViewDaily
+from conftest import count_queries, login
+
+# usuario, categorías, conteo por categoría, productos, imágenes (selectin),
+# visitas por producto y más visitados
+DASHBOARD_QUERIES = 7
+# usuario, categorías, conteo por categoría, página de productos, imágenes,
+# visitas por producto y más visitados
+DASHBOARD_CATEGORY_QUERIES = 7
+
+def add_catalog(user, products_per_category):
+    categories = [Category(user_id=user.id, name=f'Categoría {i}', slug=f'u{user.id}-categoria-{i}')
+                  for i in range(3)]
+    db.session.add_all(categories)
+    db.session.flush()
+    for category in categories + [None]:
+        for i in range(products_per_category):
+            product = Product(
+                sku=f'U{user.id}-{category.id if category else 0}-{i}',
+                name=f'Producto {i}',
+                slug=f'producto-{i}',
+                price=Decimal('9.99'),
+                category_id=category.id if category else None,
+                created_by=user.id,
+            )
+            product.images = [ProductImage(filename=f'{n}.jpg', order=n) for n in range(2)]
+            db.session.add(product)
+            db.session.flush()
+            db.session.add(ProductViewDaily(product_id=product.id, day=date.today(), count=3, unique_ips=1))
+    db.session.commit()
+    return categories
+
+def dashboard_queries(client, user, **params):
+    login(client, user)
+    # Sesión vacía, como en una petición real (el usuario se vuelve a cargar)
+    db.session.remove()
+    with count_queries() as statements:
+        response = client.get('/admin/', query_string=params)
+    assert response.status_code == 200
+    return len(statements)
+
+@pytest.mark.parametrize('products_per_category', [1, 25])
+def test_dashboard_query_count(client, make_user, products_per_category):
+    user = make_user()
+    add_catalog(user, products_per_category)
+
+    assert dashboard_queries(client, user) == DASHBOARD_QUERIES
+
+@pytest.mark.parametrize('products_per_category', [1, 25])
+def test_dashboard_category_query_count(client, make_user, products_per_category):
+    user = make_user()
+    categories = add_catalog(user, products_per_category)
+
+    assert dashboard_queries(client, user, category=categories[0].id) == DASHBOARD_CATEGORY_QUERIES
+
+def test_dashboard_views_only_for_own_products(client, make_user):
+    user, other = make_user(), make_user()
+    add_catalog(user, 2)
+    add_catalog(other, 2)
+    login(client, user)
+
+    html = client.get('/admin/').get_data(as_text=True)
+    assert f'U{user.id}-0-0' in html
+    assert f'U{other.id}-0-0' not in html
@@ -0,0 +1,92 @@
+"""
+generate_image_derivatives: tamaños en disco tras una sola decodificación.
+"""
+import warnings
+
+import pytest
+from PIL import Image, features
+
+from app import utils
+from app.utils import generate_image_derivatives
+
+DERIVATIVES = {'thumb': 400, 'icon': 150}
+WIDTHS = (320, 480, 640, 800)
+
+def make_jpeg(path, width, height):
+    Image.new('RGB', (width, height), (200, 120, 40)).save(path, 'JPEG', quality=90)
+
+# 2048 y 4096 se decodifican con draft() exactamente a 1024 (1/2 y 1/4)
+@pytest.mark.parametrize('size', [(2048, 1536), (4096, 3072), (4032, 3024), (1500, 1000)])
+def test_wide_original_is_resized_on_disk(tmp_path, size):
+    path = tmp_path / 'photo.jpg'
+    make_jpeg(path, *size)
+
+    result = generate_image_derivatives(str(path), 1024, DERIVATIVES, WIDTHS)
+
+    assert result['width'] == 1024
+    with Image.open(path) as img:
+        assert img.size == (1024, size[1] * 1024 // size[0])
+    with Image.open(tmp_path / 'photo_thumb.jpg') as img:
+        assert img.width == 400
+    with Image.open(tmp_path / 'photo_icon.jpg') as img:
+        assert img.width == 150
+
+def test_small_original_is_left_untouched(tmp_path):
+    path = tmp_path / 'photo.jpg'
+    make_jpeg(path, 900, 600)
+    before = path.read_bytes()
+
+    result = generate_image_derivatives(str(path), 1024, DERIVATIVES, WIDTHS)
+
+    assert result['width'] == 900
+    assert path.read_bytes() == before
+
+def test_jpeg_srcset_uses_full_width_rung(app, tmp_path):
+    from app.models import ProductImage
+
+    path = tmp_path / 'photo.png'
+    Image.new('RGB', (4096, 3072), (200, 120, 40)).save(path, 'PNG')
+    result = generate_image_derivatives(str(path), 1024, DERIVATIVES, WIDTHS)
+    assert (tmp_path / 'photo_1024w.jpg').exists()
+
+    image = ProductImage(product_id=1, filename='photo.png', status='ready', **result)
+    with app.test_request_context():
+        srcset = image.srcset()
+    assert srcset.endswith(f"/uploads/products/1/photo_1024w.jpg?v={result['version']} 1024w")
+    assert 'photo.png' not in srcset
+
+def test_legacy_jpeg_srcset_skips_original(app):
+    from app.models import ProductImage
+
+    image = ProductImage(product_id=1, filename='photo.jpg', status='ready', width=1024, formats='webp')
+    with app.test_request_context():
+        assert image.srcset().endswith('photo_800w.jpg 800w')
+        assert image.srcset('webp').endswith('photo_1024w.webp 1024w')
+
+def test_reprocessing_changes_image_urls(app, tmp_path):
+    from app.models import ProductImage
+
+    path = tmp_path / 'photo.jpg'
+    make_jpeg(path, 1200, 900)
+    first = generate_image_derivatives(str(path), 1024, DERIVATIVES, WIDTHS)
+    second = generate_image_derivatives(str(path), 1024, DERIVATIVES, WIDTHS)
+    assert first['version'] != second['version']
+
+    # Mismo nombre de archivo, distinta URL: /uploads/products/ es inmutable
+    image = ProductImage(product_id=1, filename='photo.jpg', status='ready', **first)
+    with app.test_request_context():
+        before = (image.url, image.thumbnail_url, image.srcset())
+        image.version = second['version']
+        after = (image.url, image.thumbnail_url, image.srcset())
+    assert all(f"v={first['version']}" in url for url in before)
+    assert all(old != new for old, new in zip(before, after))
+
+def test_unknown_pillow_format_is_unavailable_without_warning(monkeypatch):
+    # Pillow anterior a 11.2 no conoce 'avif' ni como módulo ni como códec
+    monkeypatch.delitem(features.modules, 'avif', raising=False)
+    monkeypatch.delitem(features.codecs, 'avif', raising=False)
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        assert utils._pillow_can_encode('avif') is False
+    monkeypatch.setattr(utils, 'ENCODABLE_FORMATS', {'jpg', 'webp'})
+    assert utils.supported_variant_formats(('avif', 'webp')) == ['webp']
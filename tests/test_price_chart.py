@@ -0,0 +1,33 @@
+"""
+Datos de la gráfica de historial de precios (/admin/product/<id>/price-chart-data).
+"""
+from datetime import datetime
+from decimal import Decimal
+
+from app.models import db, Product, PriceHistory
+from conftest import login
+
+def chart(client, product, **params):
+    return client.get(f'/admin/product/{product.id}/price-chart-data', query_string=params).get_json()
+
+def test_range_start_point(client, make_user):
+    user = make_user()
+    product = Product(sku=f'C{user.id}', name='Mesa', slug='mesa', price=Decimal('30.00'), created_by=user.id)
+    db.session.add(product)
+    db.session.flush()
+    db.session.add_all(
+        PriceHistory(product_id=product.id, price=Decimal(price), changed_at=changed_at, changed_by=user.id)
+        for changed_at, price in [(datetime(2026, 1, 10, 9), '10'), (datetime(2026, 2, 1), '20'),
+                                  (datetime(2026, 2, 15, 12), '30')]
+    )
+    db.session.commit()
+    login(client, user)
+
+    # Sin cambio en `from`: se añade el precio vigente al inicio del rango
+    data = chart(client, product, **{'from': '2026-01-20'})['data']
+    assert [(point['date'], point['price']) for point in data] == [
+        ('2026-01-20 00:00', 10.0), ('2026-02-01 00:00', 20.0), ('2026-02-15 12:00', 30.0)]
+
+    # Cambio justo en `from`: un solo punto en esa fecha
+    data = chart(client, product, **{'from': '2026-02-01'})['data']
+    assert [(point['date'], point['price']) for point in data] == [('2026-02-01 00:00', 20.0), ('2026-02-15 12:00', 30.0)]
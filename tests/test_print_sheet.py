@@ -0,0 +1,50 @@
+"""
+Hoja de etiquetas (/admin/print-sheet): número de etiquetas por respuesta.
+"""
+from decimal import Decimal
+
+import pytest
+
+from app.models import db, Product, Store
+from app.qr_routes import _sheet_layout
+from conftest import login
+
+def labels(html, user):
+    return {i for i in range(25) if f'L{user.id}-{i:03}' in html}
+
+@pytest.fixture
+def max_labels(app):
+    previous = app.config['PRINT_SHEET_MAX_LABELS']
+    yield app.config
+    app.config['PRINT_SHEET_MAX_LABELS'] = previous
+
+def test_active_scope_is_split_in_parts(client, make_user, max_labels):
+    user = make_user()
+    db.session.add_all(
+        Product(sku=f'L{user.id}-{i:03}', name=f'Etiqueta {i:03}', slug='etiqueta', price=Decimal('1.00'),
+                created_by=user.id)
+        for i in range(25)
+    )
+    db.session.commit()
+    columns, rows = _sheet_layout(Store.get_store(user.id), 'a4')
+    per_sheet = columns * rows
+    login(client, user)
+
+    # Menos que una hoja: se redondea a una hoja completa por parte
+    max_labels['PRINT_SHEET_MAX_LABELS'] = 1
+    first = client.get('/admin/print-sheet', query_string={'scope': 'active', 'format': 'svg'}).get_data(as_text=True)
+    assert len(labels(first, user)) == min(per_sheet, 25)
+    if per_sheet < 25:
+        assert 'parte 1 de' in first
+
+    # Todas las partes juntas cubren todos los productos, sin repetir
+    seen = []
+    part = 1
+    while True:
+        html = client.get('/admin/print-sheet',
+                          query_string={'scope': 'active', 'format': 'svg', 'part': part}).get_data(as_text=True)
+        seen.extend(labels(html, user))
+        if 'Siguiente' not in html:
+            break
+        part += 1
+    assert sorted(seen) == list(range(25))
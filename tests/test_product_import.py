@@ -0,0 +1,26 @@
+"""
+Importación masiva de productos (ProductImporter).
+"""
+from decimal import Decimal
+
+from app.models import db, Product
+from app.product_import import ProductImporter
+
+def test_sku_of_another_store_is_an_error(app_context, make_user):
+    user, other = make_user(), make_user()
+    db.session.add_all([
+        Product(sku=f'OWN-{user.id}', name='Propio', slug='propio', price=Decimal('1.00'), created_by=user.id),
+        Product(sku=f'OTHER-{other.id}', name='Ajeno', slug='ajeno', price=Decimal('1.00'), created_by=other.id),
+    ])
+    db.session.commit()
+
+    result = ProductImporter(user.id).run([
+        ['sku', 'name', 'price'],
+        [f'OWN-{user.id}', 'Propio', '2'],
+        [f'OTHER-{other.id}', 'Ajeno', '2'],
+        [f'NEW-{user.id}', 'Nuevo', '2'],
+    ])
+
+    assert (result.created, result.skipped, result.error_count) == (1, 1, 1)
+    assert result.errors[0][0] == 3
+    assert db.session.scalar(db.select(Product.created_by).where(Product.sku == f'OTHER-{other.id}')) == other.id
@@ -0,0 +1,42 @@
+"""
+Página pública /p/<sku> con la caché de páginas en memoria.
+"""
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+from app.models import db, Product
+from app.page_cache import page_cache, MemoryBackend
+
+@pytest.fixture
+def memory_cache():
+    previous = page_cache.backend
+    page_cache.backend = MemoryBackend(300, 100)
+    yield page_cache
+    page_cache.backend = previous
+
+def change_elsewhere(product, **values):
+    # Como otro worker: cambia la fila sin invalidar la caché de este proceso
+    db.session.execute(db.update(Product).where(Product.id == product.id)
+                       .values(updated_at=datetime.utcnow() + timedelta(seconds=1), **values))
+    db.session.commit()
+
+def test_stale_cache_entry_is_not_served(client, make_user, memory_cache):
+    user = make_user()
+    product = Product(sku=f'P{user.id}', name='Lámpara', slug='lampara', price=Decimal('10.00'), created_by=user.id)
+    db.session.add(product)
+    db.session.commit()
+    url = f'/p/{product.sku}'
+
+    first = client.get(url)
+    assert 'Lámpara' in first.get_data(as_text=True)
+    assert client.get(url).headers['ETag'] == first.headers['ETag']
+
+    change_elsewhere(product, name='Lámpara de pie')
+    renamed = client.get(url)
+    assert 'Lámpara de pie' in renamed.get_data(as_text=True)
+    assert renamed.headers['ETag'] != first.headers['ETag']
+
+    change_elsewhere(product, active=False)
+    assert client.get(url).status_code == 404
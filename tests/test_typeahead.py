@@ -0,0 +1,40 @@
+"""
+Índice de prefijos del typeahead (/admin/api/search).
+"""
+from decimal import Decimal
+
+from app.models import db, Product, ProductImage
+from app.search import typeahead_index
+from conftest import login
+
+def add_product(user, sku, name, **kwargs):
+    product = Product(sku=sku, name=name, slug=name.lower(), price=Decimal('5.00'), created_by=user.id, **kwargs)
+    db.session.add(product)
+    db.session.commit()
+    return product
+
+def test_delete_does_not_mutate_published_lists(app_context, make_user):
+    user = make_user()
+    kept = add_product(user, f'T{user.id}-1', 'Taza roja')
+    deleted = add_product(user, f'T{user.id}-2', 'Taza azul')
+    assert len(typeahead_index.search(user.id, 'taza')) == 2
+
+    # Lo que vería una búsqueda que empezó antes del borrado
+    snapshot = typeahead_index._tenants[user.id]
+    keys = list(snapshot['keys'])
+    db.session.delete(deleted)
+    db.session.commit()
+
+    assert snapshot['keys'] == keys
+    assert deleted.id in snapshot['products']
+    assert [entry['id'] for entry in typeahead_index.search(user.id, 'taza')] == [kept.id]
+
+def test_api_search_icon_url(client, make_user):
+    user = make_user()
+    product = add_product(user, f'T{user.id}-3', 'Vaso')
+    db.session.add(ProductImage(product_id=product.id, filename='abc.jpg', status='ready', version='v1'))
+    db.session.commit()
+    login(client, user)
+
+    result = client.get('/admin/api/search', query_string={'q': 'vaso'}).get_json()['results'][0]
+    assert result['thumbnail_url'] == f'/uploads/products/{product.id}/abc_icon.jpg?v=v1'
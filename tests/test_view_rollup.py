@@ -0,0 +1,47 @@
+"""
+Rollup diario de visitas (ProductViewDaily.refresh).
+"""
+from datetime import datetime
+from decimal import Decimal
+
+from app.models import db, Product, ProductView, ProductViewDaily
+from app.view_tracking import view_tracker
+
+def view(product_id, ip):
+    return {'product_id': product_id, 'viewed_at': datetime.utcnow(), 'ip_address': ip, 'user_agent': ''}
+
+def test_batches_update_existing_day_row(app_context, make_user):
+    user = make_user()
+    product = Product(sku=f'R{user.id}', name='Rollup', slug='rollup', price=Decimal('1.00'), created_by=user.id)
+    db.session.add(product)
+    db.session.commit()
+
+    view_tracker._write([view(product.id, '10.0.0.1'), view(product.id, '10.0.0.2')])
+    view_tracker._write([view(product.id, '10.0.0.1')])
+
+    rows = db.session.execute(
+        db.select(ProductViewDaily.count, ProductViewDaily.unique_ips)
+        .where(ProductViewDaily.product_id == product.id)
+    ).all()
+    assert rows == [(3, 2)]
+
+def test_views_of_deleted_products_do_not_sink_the_batch(app_context, make_user):
+    user = make_user()
+    product = Product(sku=f'D{user.id}', name='Vivo', slug='vivo', price=Decimal('1.00'), created_by=user.id)
+    gone = Product(sku=f'G{user.id}', name='Borrado', slug='borrado', price=Decimal('1.00'), created_by=user.id)
+    db.session.add_all([product, gone])
+    db.session.commit()
+    gone_id = gone.id
+    db.session.delete(gone)
+    db.session.commit()
+    orphaned = view_tracker.stats()['orphaned']
+
+    view_tracker._write([view(product.id, '10.0.0.1'), view(gone_id, '10.0.0.1'), view(product.id, '10.0.0.2')])
+
+    assert view_tracker.stats()['orphaned'] == orphaned + 1
+    counts = dict(db.session.execute(
+        db.select(ProductViewDaily.product_id, ProductViewDaily.count)
+        .where(ProductViewDaily.product_id.in_([product.id, gone_id]))
+    ).all())
+    assert counts == {product.id: 2}
+    assert db.session.scalar(db.select(db.func.count(ProductView.id)).where(ProductView.product_id == gone_id)) == 0